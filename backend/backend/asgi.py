@@ -8,9 +8,27 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
 
 import os
+from asyncio import to_thread
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from telemetry.writer import writer  # noqa: E402, needs the apps loaded.
+
+
+async def application(scope, receive, send):
+    """Django, plus the lifespan protocol to write buffered telemetry on
+    shutdown, as `atexit` does not run in `uvicorn --workers` processes."""
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await to_thread(writer.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
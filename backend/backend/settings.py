@@ -85,6 +85,41 @@ DATABASES = {
     }
 }
 
+# Threads async views run database queries and other blocking work in,
+# however many connections are open. See `train.aio`.
+BLOCKING_THREADS = 32
+
+
+# Telemetry is written in the background in batches of up to
+# `TELEMETRY_FLUSH_ROWS` rows at least every `TELEMETRY_FLUSH_INTERVAL`
+# seconds. Requests are answered 429 if `TELEMETRY_BUFFER_SIZE` rows are
+# waiting, asking to retry after `TELEMETRY_RETRY_AFTER` seconds.
+# Batch requests of more than `TELEMETRY_MAX_BATCH` records are answered 413.
+# See `telemetry.writer`.
+TELEMETRY_BUFFER_SIZE = 10000
+TELEMETRY_FLUSH_ROWS = 500
+TELEMETRY_FLUSH_INTERVAL = 1.0
+TELEMETRY_RETRY_AFTER = 1
+TELEMETRY_MAX_BATCH = 1000
+# Months of raw telemetry `manage.py prune_telemetry` keeps, including the
+# current one, or `None` to keep all. Rollups are kept regardless.
+TELEMETRY_RETENTION_MONTHS: int | None = 12
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Caches advertised models, see `train.advertised`. Use a shared backend,
+# e.g., Redis, when running multiple web workers so uploads invalidate all.
+# Otherwise, each worker advertises changes made through another worker,
+# or the admin, after at most `ADVERTISED_CACHE_TIMEOUT` seconds.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+ADVERTISED_CACHE_TIMEOUT = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -126,6 +161,70 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Largest model file accepted by `train/upload`, in bytes.
+MAX_MODEL_FILE_SIZE = 1024 * 1024 * 1024
+
+# Ports Flower servers listen on, one per concurrently training model.
+FLOWER_PORTS = range(8080, 8090)
+# Most Flower servers to run at once, or `None` for one per port.
+MAX_FLOWER_SERVERS: int | None = None
+# Idle processes kept ready to run Flower servers, see `train.workers`.
+FLOWER_WARM_WORKERS = 2
+# Default training configuration, see `train.serializers.TrainingConfigSerializer`.
+# Overridden per model by `MLModel.training`.
+TRAINING_CONFIG = {
+    "num_rounds": 3,
+    "fraction_fit": 1.0,
+    "fraction_evaluate": 1.0,
+    "min_fit_clients": 1,
+    "min_evaluate_clients": 1,
+    "min_available_clients": 1,
+    "evaluate_every": 1,
+    "batch_size": 32,
+    "local_epochs": 2,
+    "round_timeout": None,
+    "quorum": 1,
+    "buffer_size": None,
+}
+# Seconds between each web worker confirming the Flower servers it runs are
+# alive, and after which other workers consider them gone.
+# See `train.scheduler`.
+FLOWER_HEARTBEAT_INTERVAL = 10
+FLOWER_HEARTBEAT_TIMEOUT = 30
+# Seconds a Flower server may run in total, and without handing over
+# a checkpoint, before it is stopped, then killed if it is still running
+# `FLOWER_KILL_GRACE` seconds later. See `train.scheduler.Supervisor`.
+# With a `round_timeout`, derived from the training configuration instead,
+# allowing `FLOWER_IDLE_TIMEOUT` to wait for clients. See `scheduler.timeouts`.
+FLOWER_SESSION_TIMEOUT = 10 * 60
+FLOWER_IDLE_TIMEOUT = 5 * 60
+FLOWER_KILL_GRACE = 5
+
+# Content-addressed parameter checkpoints, see `train.blobs`.
+PARAMS_BLOB_DIR = BASE_DIR / "blobs"
+
+# Checkpoint encoding, see `train.checkpoints`.
+# `None` stores every checkpoint in full. `"fp16"` or `"int8"` stores a full
+# keyframe every `PARAMS_KEYFRAME_INTERVAL` checkpoints and, in between,
+# deltas against it quantized as such, as long as no parameter is off by
+# more than `PARAMS_DELTA_MAX_ERROR`.
+PARAMS_DELTA: str | None = None
+PARAMS_KEYFRAME_INTERVAL = 10
+PARAMS_DELTA_MAX_ERROR = 1e-3
+
+# Bytes of decoded parameters to keep in memory, see `train.cache`.
+PARAMS_CACHE_BYTES = 256 * 1024 * 1024
+
+# Default checkpoint retention policy, see `train.retention`.
+# Overridden per model by `MLModel.retention`.
+PARAMS_RETENTION = {"keep_last": 10, "per_session": True, "per_day": True}
+# Seconds between background compactions, or `None` to only compact with
+# `manage.py compact_params`.
+PARAMS_RETENTION_INTERVAL: int | None = 60 * 60
+# Unreferenced blobs younger than this many seconds are not collected,
+# because their row may not be saved yet.
+PARAMS_BLOB_GRACE = 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -16,6 +16,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework import routers
+from train.views import static_file
+
+from backend.settings import STATIC_URL
 
 router = routers.DefaultRouter()
 
@@ -25,4 +28,5 @@ urlpatterns = [
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
     path("train/", include("train.urls")),
     path("telemetry/", include("telemetry.urls")),
+    path(f"{STATIC_URL}<path:path>", static_file),
 ]
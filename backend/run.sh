@@ -10,5 +10,5 @@ else
     echo "-- Not first container startup, skipping initialization --"
 fi
 # run the server
-echo "-- Starting development server --"
-python3 /app/manage.py runserver 0.0.0.0:8000
+echo "-- Starting ASGI server --"
+python3 -m uvicorn --app-dir /app backend.asgi:application --host 0.0.0.0 --port 8000 --lifespan on --workers "${WEB_WORKERS:-1}"
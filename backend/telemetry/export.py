@@ -0,0 +1,172 @@
+"""Streaming columnar export of raw telemetry in constant memory."""
+from datetime import datetime
+from io import RawIOBase
+from typing import IO, Iterator
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy as np
+from django.db.models import Model, QuerySet
+from telemetry.models import EvaluateInsTelemetryData, FitInsTelemetryData
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = 10000
+KINDS: dict[str, tuple[type[Model], list[str]]] = {
+    "fit_ins": (
+        FitInsTelemetryData,
+        ["id", "device_id", "session_id", "start", "end"],
+    ),
+    "evaluate_ins": (
+        EvaluateInsTelemetryData,
+        [
+            "id",
+            "device_id",
+            "session_id",
+            "start",
+            "end",
+            "loss",
+            "accuracy",
+            "test_size",
+        ],
+    ),
+}
+"""Model and exported columns of each kind of telemetry.
+`start` and `end` are exported as milliseconds since the epoch."""
+FORMATS = ["arrow", "parquet", "npz"]
+CONTENT_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+    "npz": "application/zip",
+}
+
+
+def default_format() -> str:
+    return "npz" if pyarrow is None else "parquet"
+
+
+def telemetry_rows(
+    kind: str,
+    session_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> QuerySet:
+    """`kind` telemetry rows as tuples of its columns, oldest first."""
+    model, columns = KINDS[kind]
+    rows = model.objects.all()  # type: ignore
+    if session_id is not None:
+        rows = rows.filter(session_id=session_id)
+    if since is not None:
+        rows = rows.filter(start__gte=since)
+    if until is not None:
+        rows = rows.filter(start__lt=until)
+    return rows.order_by("id").values_list(*columns)
+
+
+def millis(time: datetime) -> int:
+    return round(time.timestamp() * 1000)
+
+
+def from_millis(value: str | int | None) -> datetime | None:
+    """Parse milliseconds since the epoch, as `millis` exports.
+    Raise `ValueError` if `value` is not an integer."""
+    if value is None or value == "":
+        return None
+    return datetime.fromtimestamp(int(value) / 1000)
+
+
+def column_chunks(kind: str, rows: QuerySet) -> Iterator[dict[str, np.ndarray]]:
+    """Columns of `rows`, `CHUNK_SIZE` rows at a time,
+    read from the database in chunks instead of all at once."""
+    columns = KINDS[kind][1]
+    chunk: list[tuple] = []
+
+    def to_columns() -> dict[str, np.ndarray]:
+        result = {}
+        for name, values in zip(columns, zip(*chunk)):
+            if name in ("start", "end"):
+                values = [millis(value) for value in values]
+            result[name] = np.asarray(values)
+        return result
+
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield to_columns()
+            chunk = []
+    if chunk:
+        yield to_columns()
+
+
+def export_steps(kind: str, rows: QuerySet, format: str, out: IO[bytes]):
+    """Write `rows` of `kind` telemetry to `out` in `format`,
+    yielding after each chunk of rows. `out` need not be seekable."""
+    chunks = column_chunks(kind, rows)
+    if format == "npz":
+        # Entries are named `{chunk}/{column}`, each a `.npy` array.
+        with ZipFile(out, "w", ZIP_DEFLATED) as archive:
+            for index, columns in enumerate(chunks):
+                for name, values in columns.items():
+                    with archive.open(f"{index:06d}/{name}.npy", "w") as entry:
+                        np.lib.format.write_array(entry, values)
+                yield
+        return
+    if pyarrow is None:
+        raise ValueError(f"Exporting as {format} needs `pyarrow` installed.")
+    writer = None
+    for columns in chunks:
+        batch = pyarrow.RecordBatch.from_pydict(columns)
+        if writer is None:
+            if format == "arrow":
+                writer = pyarrow.ipc.new_stream(out, batch.schema)
+            else:
+                writer = pyarrow.parquet.ParquetWriter(out, batch.schema)
+        writer.write_batch(batch)
+        yield
+    if writer is not None:
+        writer.close()
+
+
+def write_export(kind: str, rows: QuerySet, format: str, out: IO[bytes]):
+    """Write `rows` of `kind` telemetry to `out` in `format`."""
+    for _ in export_steps(kind, rows, format, out):
+        pass
+
+
+class ChunkedSink(RawIOBase):
+    """Write-only, unseekable file holding what is written until drained."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_export(kind: str, rows: QuerySet, format: str) -> Iterator[bytes]:
+    """`write_export` as an iterator of bytes, e.g., to stream over HTTP."""
+    sink = ChunkedSink()
+    for _ in export_steps(kind, rows, format, sink):  # type: ignore
+        if data := sink.drain():
+            yield data
+    if data := sink.drain():
+        yield data
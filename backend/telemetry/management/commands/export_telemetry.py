@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from telemetry.export import (
+    FORMATS,
+    KINDS,
+    default_format,
+    from_millis,
+    telemetry_rows,
+    write_export,
+)
+
+
+class Command(BaseCommand):
+    help = "Export raw telemetry as Arrow IPC, Parquet or chunked `.npz`."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=list(KINDS), default="fit_ins")
+        parser.add_argument("--session", type=int, help="Training session ID.")
+        parser.add_argument(
+            "--since", help="Start time in milliseconds since the epoch."
+        )
+        parser.add_argument(
+            "--until", help="End time in milliseconds since the epoch, exclusive."
+        )
+        parser.add_argument("--format", choices=FORMATS, default=default_format())
+        parser.add_argument("--output", help="File to write, or stdout if omitted.")
+
+    def handle(self, *args, **options):
+        try:
+            since = from_millis(options["since"])
+            until = from_millis(options["until"])
+        except ValueError as err:
+            raise CommandError(f"Invalid time: {err}")
+        kind, format, output = options["kind"], options["format"], options["output"]
+        rows = telemetry_rows(kind, options["session"], since, until)
+        try:
+            if output is None:
+                write_export(kind, rows, format, sys.stdout.buffer)
+                return
+            with open(output, "wb") as file:
+                write_export(kind, rows, format, file)
+        except ValueError as err:
+            raise CommandError(str(err))
+        self.stdout.write(f"Exported {kind} telemetry to {output}.")
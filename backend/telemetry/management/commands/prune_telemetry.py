@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from telemetry.retention import prune
+
+from backend.settings import TELEMETRY_RETENTION_MONTHS
+
+
+class Command(BaseCommand):
+    help = "Delete raw telemetry older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=TELEMETRY_RETENTION_MONTHS,
+            help="Months of telemetry to keep, including the current one.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune(options["months"])
+        self.stdout.write(f"Deleted {deleted} telemetry rows.")
@@ -0,0 +1,83 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("telemetry", "0002_alter_evaluateinstelemetrydata_device_id_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TelemetryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("round", models.IntegerField(editable=False)),
+                ("fit_count", models.BigIntegerField(default=0)),
+                ("fit_seconds_sum", models.FloatField(default=0.0)),
+                ("fit_seconds_max", models.FloatField(default=0.0)),
+                ("fit_seconds_zero", models.BigIntegerField(default=0)),
+                ("evaluate_count", models.BigIntegerField(default=0)),
+                ("test_size_sum", models.BigIntegerField(default=0)),
+                ("loss_sum", models.FloatField(default=0.0)),
+                ("accuracy_sum", models.FloatField(default=0.0)),
+                (
+                    "session",
+                    models.ForeignKey(
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="telemetry.trainingsession",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="telemetryrollup",
+            constraint=models.UniqueConstraint(
+                fields=("session", "round"), name="unique_session_round"
+            ),
+        ),
+        migrations.CreateModel(
+            name="FitSecondsBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("round", models.IntegerField(editable=False)),
+                ("key", models.IntegerField(editable=False)),
+                ("count", models.BigIntegerField(default=0)),
+                (
+                    "session",
+                    models.ForeignKey(
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fit_seconds_buckets",
+                        to="telemetry.trainingsession",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("session", "round", "key"),
+                        name="unique_session_round_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations, models
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def fill_buckets(apps, _):
+    for name in ("FitInsTelemetryData", "EvaluateInsTelemetryData"):
+        model = apps.get_model("telemetry", name)
+        model.objects.update(
+            bucket=ExtractYear("start") * 12 + ExtractMonth("start") - 1
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("telemetry", "0003_telemetryrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fitinstelemetrydata",
+            name="bucket",
+            field=models.IntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="evaluateinstelemetrydata",
+            name="bucket",
+            field=models.IntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="fitinstelemetrydata",
+            index=models.Index(
+                fields=["session_id", "start"], name="fit_ins_session_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fitinstelemetrydata",
+            index=models.Index(
+                fields=["device_id", "start"], name="fit_ins_device_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fitinstelemetrydata",
+            index=models.Index(fields=["bucket"], name="fit_ins_bucket"),
+        ),
+        migrations.AddIndex(
+            model_name="evaluateinstelemetrydata",
+            index=models.Index(
+                fields=["session_id", "start"], name="evaluate_ins_session_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="evaluateinstelemetrydata",
+            index=models.Index(
+                fields=["device_id", "start"], name="evaluate_ins_device_start"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="evaluateinstelemetrydata",
+            index=models.Index(fields=["bucket"], name="evaluate_ins_bucket"),
+        ),
+    ]
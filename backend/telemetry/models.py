@@ -1,7 +1,14 @@
+from datetime import datetime
+
 from django.db import models
 from train.models import MLModel
 
 
+def month_bucket(time: datetime) -> int:
+    """Months since year 0 of `time`, to partition telemetry by."""
+    return time.year * 12 + time.month - 1
+
+
 class TrainingSession(models.Model):
     id: int  # Help static analysis.
     tflite_model = models.ForeignKey(
@@ -30,6 +37,20 @@ class FitInsTelemetryData(models.Model):
     )
     start = models.DateTimeField(editable=False)
     end = models.DateTimeField(editable=False)
+    bucket = models.IntegerField(editable=False)
+    """`month_bucket` of `start`, set on `save`. Set it yourself for
+    `bulk_create`."""
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["session_id", "start"], name="fit_ins_session_start"),
+            models.Index(fields=["device_id", "start"], name="fit_ins_device_start"),
+            models.Index(fields=["bucket"], name="fit_ins_bucket"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.bucket = month_bucket(self.start)
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"FitIns {self.id} on {self.device_id} {self.start} - {self.end}"
@@ -50,7 +71,87 @@ class EvaluateInsTelemetryData(models.Model):
     loss = models.FloatField(editable=False)
     accuracy = models.FloatField(editable=False)
     test_size = models.BigIntegerField(editable=False)
+    bucket = models.IntegerField(editable=False)
+    """`month_bucket` of `start`, set on `save`. Set it yourself for
+    `bulk_create`."""
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session_id", "start"], name="evaluate_ins_session_start"
+            ),
+            models.Index(
+                fields=["device_id", "start"], name="evaluate_ins_device_start"
+            ),
+            models.Index(fields=["bucket"], name="evaluate_ins_bucket"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.bucket = month_bucket(self.start)
+        super().save(*args, **kwargs)
 
     def __str__(self) -> str:
         return f"EvaluateIns {self.id} on {self.device_id} {self.start} - \
 {self.end} loss: {self.loss} accuracy: {self.accuracy} test_size: {self.test_size}"
+
+
+class TelemetryRollup(models.Model):
+    """Aggregates of the telemetry of one round of a training session,
+    updated as telemetry is written. See `rollups`."""
+
+    id: int  # Help static analysis.
+    session = models.ForeignKey(
+        TrainingSession,
+        on_delete=models.CASCADE,
+        related_name="rollups",
+        editable=False,
+    )
+    round = models.IntegerField(editable=False)
+    """1-based, by when the telemetry started. See `rollups.round_of`."""
+    fit_count = models.BigIntegerField(default=0)
+    fit_seconds_sum = models.FloatField(default=0.0)
+    fit_seconds_max = models.FloatField(default=0.0)
+    fit_seconds_zero = models.BigIntegerField(default=0)
+    """Fits of at most 0 seconds. The `sketch` of the others is in
+    `FitSecondsBucket`s."""
+    evaluate_count = models.BigIntegerField(default=0)
+    test_size_sum = models.BigIntegerField(default=0)
+    loss_sum = models.FloatField(default=0.0)
+    """Sum of loss weighted by test size."""
+    accuracy_sum = models.FloatField(default=0.0)
+    """Sum of accuracy weighted by test size."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "round"], name="unique_session_round"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"TelemetryRollup of session {self.session_id} round {self.round}: \
+{self.fit_count} fits, {self.evaluate_count} evaluations"
+
+
+class FitSecondsBucket(models.Model):
+    """Fits of one round of a training session whose duration falls in a
+    `sketch` bucket, a row per bucket so ingest can increment it in place."""
+
+    id: int  # Help static analysis.
+    session = models.ForeignKey(
+        TrainingSession,
+        on_delete=models.CASCADE,
+        related_name="fit_seconds_buckets",
+        editable=False,
+    )
+    round = models.IntegerField(editable=False)
+    key = models.IntegerField(editable=False)
+    """`sketch.bucket` of the durations."""
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "round", "key"], name="unique_session_round_key"
+            )
+        ]
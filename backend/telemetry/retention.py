@@ -0,0 +1,32 @@
+"""Dropping raw telemetry older than the retention period."""
+from datetime import datetime
+from logging import getLogger
+
+from telemetry.models import EvaluateInsTelemetryData, FitInsTelemetryData, month_bucket
+
+from backend.settings import TELEMETRY_RETENTION_MONTHS
+
+BATCH_SIZE = 500
+
+logger = getLogger(__name__)
+
+
+def prune(months: int | None = TELEMETRY_RETENTION_MONTHS) -> int:
+    """Delete raw telemetry from before the last `months` months.
+    Return the number of rows deleted.
+    This takes time linear in the rows deleted, unlike dropping a partition,
+    but deletes at most `BATCH_SIZE` rows found through the bucket index per
+    statement, so each holds the write lock briefly."""
+    if months is None:
+        return 0
+    cutoff = month_bucket(datetime.now()) - months + 1
+    deleted = 0
+    for model in (FitInsTelemetryData, EvaluateInsTelemetryData):
+        old = model.objects.filter(bucket__lt=cutoff).values_list("id", flat=True)
+        while ids := list(old[:BATCH_SIZE]):
+            # No signals or cascades, so this is a single `DELETE`.
+            count, _ = model.objects.filter(id__in=ids).delete()
+            deleted += count
+    if deleted:
+        logger.warning(f"Deleted {deleted} telemetry rows before bucket {cutoff}.")
+    return deleted
@@ -0,0 +1,169 @@
+"""Per session and round aggregates of telemetry, maintained on ingest."""
+from bisect import bisect_right
+from datetime import datetime
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from telemetry import sketch
+from telemetry.models import (
+    EvaluateInsTelemetryData,
+    FitInsTelemetryData,
+    FitSecondsBucket,
+    TelemetryRollup,
+    TrainingSession,
+)
+from train.models import ModelParams
+
+QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+SUMS = [
+    "fit_count",
+    "fit_seconds_sum",
+    "fit_seconds_zero",
+    "evaluate_count",
+    "test_size_sum",
+    "loss_sum",
+    "accuracy_sum",
+]
+"""`TelemetryRollup` fields `update_rollups` adds to."""
+
+
+def checkpoint_times(session_ids: set[int]) -> dict[int, list[datetime]]:
+    """When each session stored each of its checkpoints, in order."""
+    times: dict[int, list[datetime]] = {id: [] for id in session_ids}
+    for session_id, created in (
+        ModelParams.objects.filter(session_id__in=session_ids)
+        .order_by("created")
+        .values_list("session_id", "created")
+    ):
+        times[session_id].append(created)
+    return times
+
+
+def round_of(row: models.Model, times: list[datetime]) -> int:
+    """Round telemetry `row` of a session checkpointed at `times` is from.
+    Round `n` fits on the parameters of checkpoint `n - 1` and stores
+    checkpoint `n`, then evaluates on it.
+    `start` is by the device's clock and `times` by the server's, so a row
+    within the clock skew of a checkpoint may be counted in a neighboring
+    round. Rounds usually last far longer than devices' clocks are off."""
+    stored = bisect_right(times, row.start)  # type: ignore
+    if isinstance(row, FitInsTelemetryData):
+        return stored + 1
+    return max(stored, 1)
+
+
+def increment(model: type[models.Model], keys: dict, sums: dict, maxima: dict):
+    """Add `sums` to the fields of the `model` row with `keys`, and raise its
+    fields to `maxima`, in place, creating the row if there is none."""
+    updates = {field: F(field) + value for field, value in sums.items()}
+    updates.update(
+        {field: Greatest(field, Value(value)) for field, value in maxima.items()}
+    )
+    rows = model.objects.filter(**keys)  # type: ignore
+    if rows.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **sums, **maxima)  # type: ignore
+    except IntegrityError:
+        # Another writer created it just now.
+        rows.update(**updates)
+
+
+def update_rollups(rows: list[models.Model]):
+    """Fold newly written telemetry `rows` into their rollups.
+    Call in the transaction that writes `rows`, so they never disagree."""
+    rows = [
+        row
+        for row in rows
+        if isinstance(row, (FitInsTelemetryData, EvaluateInsTelemetryData))
+    ]
+    if not rows:
+        return
+    times = checkpoint_times({row.session_id_id for row in rows})  # type: ignore
+    deltas: dict[tuple[int, int], TelemetryRollup] = {}
+    buckets: dict[tuple[int, int, int], int] = {}
+    for row in rows:
+        session_id: int = row.session_id_id  # type: ignore
+        key = (session_id, round_of(row, times[session_id]))
+        delta = deltas.get(key)
+        if delta is None:
+            delta = TelemetryRollup(session_id=session_id, round=key[1])
+            deltas[key] = delta
+        if isinstance(row, FitInsTelemetryData):
+            seconds = (row.end - row.start).total_seconds()
+            delta.fit_count += 1
+            delta.fit_seconds_sum += seconds
+            delta.fit_seconds_max = max(delta.fit_seconds_max, seconds)
+            bucket = sketch.bucket(seconds)
+            if bucket is None:
+                delta.fit_seconds_zero += 1
+            else:
+                buckets[(*key, bucket)] = buckets.get((*key, bucket), 0) + 1
+        else:
+            delta.evaluate_count += 1
+            delta.test_size_sum += row.test_size
+            delta.loss_sum += row.loss * row.test_size
+            delta.accuracy_sum += row.accuracy * row.test_size
+    for (session_id, round), delta in deltas.items():
+        increment(
+            TelemetryRollup,
+            {"session_id": session_id, "round": round},
+            {field: getattr(delta, field) for field in SUMS},
+            {"fit_seconds_max": delta.fit_seconds_max},
+        )
+    for (session_id, round, key), count in buckets.items():
+        increment(
+            FitSecondsBucket,
+            {"session_id": session_id, "round": round, "key": key},
+            {"count": count},
+            {},
+        )
+
+
+def merge(rollup: TelemetryRollup, other: TelemetryRollup):
+    """Add the aggregates of `other` into `rollup`."""
+    for field in SUMS:
+        setattr(rollup, field, getattr(rollup, field) + getattr(other, field))
+    rollup.fit_seconds_max = max(rollup.fit_seconds_max, other.fit_seconds_max)
+
+
+def summary(rollup: TelemetryRollup, fit_seconds: dict) -> dict:
+    """Means, maximum, quantiles and test-size-weighted metrics of `rollup`,
+    whose fit durations are in `sketch` `fit_seconds`."""
+    fit_count, test_size = rollup.fit_count, rollup.test_size_sum
+    result = {
+        "round": rollup.round,
+        "fit_count": fit_count,
+        "fit_seconds_mean": rollup.fit_seconds_sum / fit_count if fit_count else None,
+        "fit_seconds_max": rollup.fit_seconds_max if fit_count else None,
+        "evaluate_count": rollup.evaluate_count,
+        "test_size": test_size,
+        "loss": rollup.loss_sum / test_size if test_size else None,
+        "accuracy": rollup.accuracy_sum / test_size if test_size else None,
+    }
+    for name, q in QUANTILES.items():
+        result[f"fit_seconds_{name}"] = sketch.quantile(fit_seconds, q)
+    return result
+
+
+def session_summary(session: TrainingSession) -> dict:
+    """`summary` of each round of `session` and of all rounds together."""
+    sketches: dict[int, dict] = {}
+    for round, key, count in session.fit_seconds_buckets.values_list(  # type: ignore
+        "round", "key", "count"
+    ):
+        sketches.setdefault(round, sketch.new_sketch())["buckets"][str(key)] = count
+    total = TelemetryRollup(session=session, round=0)
+    total_sketch = sketch.new_sketch()
+    rounds = []
+    for rollup in session.rollups.order_by("round"):  # type: ignore
+        fit_seconds = sketches.get(rollup.round, sketch.new_sketch())
+        fit_seconds["zero"] = rollup.fit_seconds_zero
+        merge(total, rollup)
+        sketch.merge(total_sketch, fit_seconds)
+        rounds.append(summary(rollup, fit_seconds))
+    overall = summary(total, total_sketch)
+    del overall["round"]
+    return {"session_id": session.id, "rounds": rounds, "total": overall}
@@ -1,8 +1,13 @@
 from datetime import datetime
 
+import numpy as np
 from rest_framework import serializers
 from telemetry.models import *
 
+INT64_MIN, INT64_MAX = -(2**63), 2**63 - 1
+MAX_MILLIS = 253_370_764_800_000
+"""Year 9999, past which timestamps are not representable."""
+
 
 class TimestampMillis(serializers.Field):
     def to_internal_value(self, milliseconds: int) -> datetime:
@@ -53,3 +58,65 @@ class EvaluateInsTelemetryDataSerializer(serializers.Serializer):
             "accuracy",
             "test_size",
         ]
+
+
+def is_number(value, integral: bool) -> bool:
+    if integral:
+        return type(value) is int and INT64_MIN <= value <= INT64_MAX
+    return type(value) in (int, float)
+
+
+def number_column(values: list, integral: bool) -> tuple[np.ndarray, np.ndarray]:
+    """`values` as 64-bit integers if `integral` or else floats,
+    and which are invalid, with 0 in their place."""
+    dtype = np.int64 if integral else np.float64
+    try:
+        column = np.array(values)
+    except (ValueError, TypeError):
+        column = np.array([None])
+    kinds = "i" if integral else "if"
+    if column.ndim == 1 and column.dtype.kind in kinds and len(column) == len(values):
+        column = column.astype(dtype)
+        invalid = np.zeros(len(values), bool)
+    else:
+        # Some are of another type or out of range, so check each.
+        invalid = np.array([not is_number(v, integral) for v in values], bool)
+        column = np.array([0 if bad else v for v, bad in zip(values, invalid)], dtype)
+    if not integral:
+        invalid |= ~np.isfinite(column)
+    return column, invalid
+
+
+def validate_batch(serializer_cls, data: list) -> tuple[list, dict[int, dict]]:
+    """Validate the records in `data` against the fields of `serializer_cls`,
+    a column at a time, rather than with a serializer per record.
+    Return `(index, validated_data)` of the valid records
+    and the errors by record index."""
+    errors: dict[int, dict] = {}
+    for index, record in enumerate(data):
+        if not isinstance(record, dict):
+            errors[index] = {"non_field_errors": ["Expected a dictionary."]}
+    columns: dict[str, list] = {}
+    for name, field in serializer_cls().fields.items():
+        values = [
+            record.get(name) if isinstance(record, dict) else 0 for record in data
+        ]
+        integral = not isinstance(field, serializers.FloatField)
+        column, invalid = number_column(values, integral)
+        if isinstance(field, TimestampMillis):
+            invalid |= (column < 0) | (column > MAX_MILLIS)
+        for index in np.flatnonzero(invalid).tolist():
+            if name not in data[index]:
+                message = "This field is required."
+            else:
+                message = f"A valid {'integer' if integral else 'number'} is required."
+            errors.setdefault(index, {})[name] = [message]
+        columns[name] = column.tolist()
+        if isinstance(field, TimestampMillis):
+            columns[name] = [field.to_internal_value(ms) for ms in columns[name]]
+    valid = [
+        (index, dict(zip(columns, record)))
+        for index, record in enumerate(zip(*columns.values()))
+        if index not in errors
+    ]
+    return valid, errors
@@ -0,0 +1,52 @@
+"""Mergeable quantile sketch with bounded relative error, after DDSketch."""
+from math import ceil, log
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = log(GAMMA)
+
+
+def new_sketch() -> dict:
+    """Sketch as a JSON-compatible dict: count of values at most 0 and
+    count of positive values in each logarithmic bucket."""
+    return {"zero": 0, "buckets": {}}
+
+
+def bucket(value: float) -> int | None:
+    """Key of the logarithmic bucket `value` counts in, `None` if at most 0."""
+    return None if value <= 0 else ceil(log(value) / LOG_GAMMA)
+
+
+def add(sketch: dict, value: float, count: int = 1):
+    key = bucket(value)
+    if key is None:
+        sketch["zero"] += count
+        return
+    buckets = sketch["buckets"]
+    buckets[str(key)] = buckets.get(str(key), 0) + count
+
+
+def merge(sketch: dict, other: dict):
+    """Add all values of `other` into `sketch`."""
+    sketch["zero"] += other["zero"]
+    buckets = sketch["buckets"]
+    for key, count in other["buckets"].items():
+        buckets[key] = buckets.get(key, 0) + count
+
+
+def quantile(sketch: dict, q: float) -> float | None:
+    """Value at quantile `q` within `RELATIVE_ACCURACY`,
+    or `None` if the sketch is empty."""
+    buckets = sorted((int(key), count) for key, count in sketch["buckets"].items())
+    total = sketch["zero"] + sum(count for _, count in buckets)
+    if total == 0:
+        return None
+    rank = q * (total - 1)
+    seen = sketch["zero"]
+    if rank < seen:
+        return 0.0
+    for key, count in buckets:
+        seen += count
+        if rank < seen:
+            return 2 * GAMMA**key / (GAMMA + 1)
+    return 2 * GAMMA ** buckets[-1][0] / (GAMMA + 1)
@@ -1,4 +1,12 @@
 from django.urls import path
 from telemetry.views import *
 
-urlpatterns = [path("evaluate_ins", evaluate_ins), path("fit_ins", fit_ins)]
+urlpatterns = [
+    path("evaluate_ins", evaluate_ins),
+    path("fit_ins", fit_ins),
+    path("evaluate_ins/batch", evaluate_ins_batch),
+    path("fit_ins/batch", fit_ins_batch),
+    path("export", export),
+    path("metrics", metrics),
+    path("rollups/<int:session_id>", rollups),
+]
@@ -1,34 +1,187 @@
 import logging
 
+from django.http import (
+    HttpRequest,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework import permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+    HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    HTTP_429_TOO_MANY_REQUESTS,
+)
 from rest_framework.views import Request  # type: ignore
+from telemetry.export import (
+    CONTENT_TYPES,
+    KINDS,
+    default_format,
+    from_millis,
+    pyarrow,
+    stream_export,
+    telemetry_rows,
+)
+from telemetry.models import (
+    EvaluateInsTelemetryData,
+    FitInsTelemetryData,
+    TrainingSession,
+    month_bucket,
+)
+from telemetry.rollups import session_summary
 from telemetry.serializers import (
     EvaluateInsTelemetryDataSerializer,
     FitInsTelemetryDataSerializer,
+    validate_batch,
 )
+from telemetry.writer import writer
+from train.aio import json_body, respond, run_blocking, streamed
+from train.cache import params_cache
+
+from backend.settings import TELEMETRY_MAX_BATCH, TELEMETRY_RETRY_AFTER
 
 logger = logging.getLogger(__name__)
 
 
-def save_serializer_and_respond(serializer) -> Response:
-    if serializer.is_valid():
-        serializer.save()
-    else:
-        logger.error(serializer.errors)
-    return Response("")
+def validate_records(serializer_cls, model_cls, data: list):
+    """Validate the records in `data` by `serializer_cls`'s fields (see
+    `validate_batch`) and look up all their sessions at once.
+    Return unsaved `model_cls` instances and the errors by record index."""
+    valid, errors = validate_batch(serializer_cls, data)
+    sessions = TrainingSession.objects.in_bulk(
+        {validated["session_id"] for _, validated in valid}
+    )
+    rows = []
+    for index, validated in valid:
+        session = sessions.get(validated["session_id"])
+        if session is None:
+            errors[index] = {"session_id": ["Training session not found."]}
+            continue
+        bucket = month_bucket(validated["start"])
+        rows.append(model_cls(**{**validated, "session_id": session, "bucket": bucket}))
+    if errors:
+        logger.error(f"Discarded {len(errors)} {model_cls.__name__}: {errors}")
+    return rows, errors
+
+
+def queue_and_respond(rows: list, body):
+    """Queue `rows` to `writer` and respond `body`,
+    or 429 if its buffer is full."""
+    if not writer.submit(rows):
+        logger.warning(f"Telemetry buffer full, rejecting {len(rows)} rows.")
+        return respond(
+            "Telemetry buffer full.",
+            HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(TELEMETRY_RETRY_AFTER)},
+        )
+    return respond(body)
+
+
+@csrf_exempt
+@require_POST
+async def fit_ins(request: HttpRequest):
+    rows, _ = await run_blocking(
+        validate_records,
+        FitInsTelemetryDataSerializer,
+        FitInsTelemetryData,
+        [json_body(request)],
+    )
+    return queue_and_respond(rows, "")
+
 
+@csrf_exempt
+@require_POST
+async def evaluate_ins(request: HttpRequest):
+    rows, _ = await run_blocking(
+        validate_records,
+        EvaluateInsTelemetryDataSerializer,
+        EvaluateInsTelemetryData,
+        [json_body(request)],
+    )
+    return queue_and_respond(rows, "")
 
-@api_view(["POST"])
+
+async def save_batch_and_respond(serializer_cls, model_cls, data):
+    """Queue the valid records in `data` to be inserted together. Respond
+    with the number queued and the errors by record index, or 413 if there
+    are more than `TELEMETRY_MAX_BATCH` or than `writer` can ever queue,
+    rather than 429 forever."""
+    if not isinstance(data, list):
+        return respond("Expected a list of records.", HTTP_400_BAD_REQUEST)
+    limit = min(TELEMETRY_MAX_BATCH, writer.capacity)
+    if len(data) > limit:
+        return respond(
+            f"At most {limit} records per batch.",
+            HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+    rows, errors = await run_blocking(validate_records, serializer_cls, model_cls, data)
+    return queue_and_respond(rows, {"accepted": len(rows), "errors": errors})
+
+
+@csrf_exempt
+@require_POST
+async def fit_ins_batch(request: HttpRequest):
+    return await save_batch_and_respond(
+        FitInsTelemetryDataSerializer, FitInsTelemetryData, json_body(request)
+    )
+
+
+@csrf_exempt
+@require_POST
+async def evaluate_ins_batch(request: HttpRequest):
+    return await save_batch_and_respond(
+        EvaluateInsTelemetryDataSerializer, EvaluateInsTelemetryData, json_body(request)
+    )
+
+
+@api_view(["GET"])
 @permission_classes((permissions.AllowAny,))
-def fit_ins(request: Request):
-    serializer = FitInsTelemetryDataSerializer(data=request.data)  # type: ignore
-    return save_serializer_and_respond(serializer)
+def rollups(_: Request, session_id: int):
+    try:
+        session = TrainingSession.objects.get(pk=session_id)
+    except TrainingSession.DoesNotExist:
+        return Response("Training session not found.", HTTP_404_NOT_FOUND)
+    return Response(session_summary(session))
 
 
-@api_view(["POST"])
+@api_view(["GET"])
 @permission_classes((permissions.AllowAny,))
-def evaluate_ins(request: Request):
-    serializer = EvaluateInsTelemetryDataSerializer(data=request.data)  # type: ignore
-    return save_serializer_and_respond(serializer)
+def metrics(_: Request):
+    """Telemetry writer and decoded parameter cache metrics of this worker."""
+    return Response({**writer.metrics(), "params_cache": params_cache.stats()})
+
+
+@require_GET
+async def export(request: HttpRequest):
+    """Stream `kind` telemetry, optionally of one `session` between `since` and
+    `until` in milliseconds since the epoch, as `format` (see `telemetry.export`).
+    Staff only, as it includes device IDs."""
+    if not (await request.auser()).is_staff:
+        return HttpResponseForbidden("Only staff may export telemetry.")
+    kind = request.GET.get("kind", "fit_ins")
+    format = request.GET.get("format", default_format())
+    if kind not in KINDS:
+        return HttpResponseBadRequest(f"Unknown telemetry kind `{kind}`.")
+    if format not in CONTENT_TYPES:
+        return HttpResponseBadRequest(f"Unknown export format `{format}`.")
+    if format != "npz" and pyarrow is None:
+        return HttpResponseBadRequest(f"Exporting as {format} is unavailable.")
+    try:
+        session = request.GET.get("session")
+        session_id = int(session) if session else None
+        since = from_millis(request.GET.get("since"))
+        until = from_millis(request.GET.get("until"))
+    except ValueError as err:
+        return HttpResponseBadRequest(f"Invalid query: {err}")
+    rows = telemetry_rows(kind, session_id, since, until)
+    extension = "arrows" if format == "arrow" else format
+    return StreamingHttpResponse(
+        streamed(request, stream_export(kind, rows, format), pinned=True),
+        content_type=CONTENT_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{extension}"'},
+    )
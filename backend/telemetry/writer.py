@@ -0,0 +1,188 @@
+"""Buffered, batched writing of telemetry rows in the background."""
+from atexit import register
+from logging import getLogger
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic, sleep
+
+from django.db import (
+    DatabaseError,
+    DataError,
+    IntegrityError,
+    OperationalError,
+    close_old_connections,
+    models,
+    transaction,
+)
+from telemetry.rollups import update_rollups
+
+from backend.settings import (
+    TELEMETRY_BUFFER_SIZE,
+    TELEMETRY_FLUSH_INTERVAL,
+    TELEMETRY_FLUSH_ROWS,
+)
+
+WRITE_ATTEMPTS = 5
+RETRY_SECONDS = 0.1
+"""First wait before writing again after the database was locked, doubled
+each attempt."""
+
+logger = getLogger(__name__)
+
+
+def insert(rows: list[models.Model]):
+    """`bulk_create` `rows` and update their rollups in one transaction,
+    trying `WRITE_ATTEMPTS` times while the database is locked or otherwise
+    unavailable."""
+    by_model: dict[type[models.Model], list[models.Model]] = {}
+    for row in rows:
+        by_model.setdefault(type(row), []).append(row)
+    for attempt in range(WRITE_ATTEMPTS):
+        # Forget IDs a rolled back attempt assigned, which may be taken now.
+        for row in rows:
+            row.pk = None
+        try:
+            with transaction.atomic():
+                for model, model_rows in by_model.items():
+                    model.objects.bulk_create(model_rows)  # type: ignore
+                update_rollups(rows)
+            return
+        except OperationalError as err:
+            if attempt == WRITE_ATTEMPTS - 1:
+                raise
+            logger.warning(f"TelemetryWriter: retrying write: {err}")
+            sleep(RETRY_SECONDS * 2**attempt)
+
+
+class TelemetryWriter:
+    """Queue unsaved model instances and `bulk_create` them, updating their
+    rollups, from a background thread once `batch_size` are queued or
+    `interval` seconds have passed.
+    At most `capacity` rows are queued; `submit` refuses more."""
+
+    def __init__(self, capacity: int, batch_size: int, interval: float) -> None:
+        self.queue: Queue[models.Model | None] = Queue(capacity)
+        """Rows to write, then `None` once closed to wake the flusher."""
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.interval = interval
+        self.lock = Lock()
+        self.thread: Thread | None = None
+        self.closed = False
+        self.held = 0
+        """Rows taken off `queue` but not yet written or dropped."""
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    def submit(self, rows: list[models.Model]) -> bool:
+        """Queue all `rows`, or none and return `False` if there is no room."""
+        with self.lock:
+            if self.closed or self.queue.qsize() + len(rows) > self.capacity:
+                return False
+            for row in rows:
+                self.queue.put_nowait(row)
+            if self.thread is None:
+                self.thread = Thread(target=self._run, daemon=True)
+                self.thread.start()
+        return True
+
+    def _run(self):
+        while not self.closed:
+            self._flush(self._take())
+
+    def _take(self) -> list[models.Model]:
+        """Wait for up to `batch_size` rows for up to `interval` seconds."""
+        rows: list[models.Model] = []
+        deadline = monotonic() + self.interval
+        while len(rows) < self.batch_size:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            try:
+                row = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if row is None:
+                break
+            rows.append(row)
+            self.held += 1
+        return rows
+
+    def _flush(self, rows: list[models.Model]):
+        if not rows:
+            return
+        self.held = len(rows)
+        start = monotonic()
+        try:
+            self._write(rows)
+        except Exception as err:
+            logger.error(f"TelemetryWriter: dropping {len(rows)} rows: {err}")
+            self.dropped += len(rows)
+        finally:
+            self.held = 0
+            close_old_connections()
+        seconds = monotonic() - start
+        self.flushes += 1
+        self.last_flush_seconds = seconds
+        self.max_flush_seconds = max(self.max_flush_seconds, seconds)
+
+    def _write(self, rows: list[models.Model]):
+        """`insert` `rows`, or if the database rejects them, each row on its
+        own, dropping only those it rejects."""
+        try:
+            insert(rows)
+            self.written += len(rows)
+            return
+        except (DataError, IntegrityError) as err:
+            logger.warning(
+                f"TelemetryWriter: writing {len(rows)} rows one by one: {err}"
+            )
+        for row in rows:
+            try:
+                insert([row])
+                self.written += 1
+            except DatabaseError as err:
+                logger.error(f"TelemetryWriter: dropping {row}: {err}")
+                self.dropped += 1
+
+    def close(self):
+        """Stop accepting rows and write everything queued."""
+        with self.lock:
+            self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except Full:
+            pass  # The flusher has a full batch to take without waiting.
+        if self.thread is not None:
+            # Let the flusher finish the batch it holds.
+            self.thread.join(self.interval + 5)
+        rows: list[models.Model] = []
+        while True:
+            try:
+                row = self.queue.get_nowait()
+            except Empty:
+                break
+            if row is not None:
+                rows.append(row)
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start : start + self.batch_size])
+
+    def metrics(self) -> dict[str, int | float]:
+        return {
+            "queue_depth": self.queue.qsize() + self.held,
+            "capacity": self.capacity,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+
+writer = TelemetryWriter(
+    TELEMETRY_BUFFER_SIZE, TELEMETRY_FLUSH_ROWS, TELEMETRY_FLUSH_INTERVAL
+)
+register(writer.close)
@@ -0,0 +1,53 @@
+"""Cached lookup of the model advertised for each kind of device."""
+from hashlib import sha256
+from json import dumps
+from logging import getLogger
+from typing import OrderedDict
+
+from django.core.cache import cache
+from train.models import MLModel, TrainingDataType
+from train.serializers import MLModelSerializer
+
+from backend.settings import ADVERTISED_CACHE_TIMEOUT
+
+VERSION_KEY = "advertised:version"
+
+logger = getLogger(__name__)
+
+
+def ml_model_for_data_type(data: OrderedDict):
+    try:
+        data_type = TrainingDataType.objects.get(name=data["data_type"])
+        filter = MLModel.objects.filter(data_type=data_type)
+        if data["tflite"]:
+            filter = filter.filter(tflite=True)
+        if data["coreml"]:
+            filter = filter.filter(coreml=True)
+        return filter.last()
+    except Exception as err:
+        logger.error(f"{err} while looking up model for `{data}`.")
+        return
+
+
+def advertised(data: OrderedDict) -> tuple[dict, str] | None:
+    """Serialized model for validated `PostAdvertisedDataSerializer` `data`
+    and its strong ETag, or `None` if there is no such model.
+    Cached until `invalidate_advertised` or for `ADVERTISED_CACHE_TIMEOUT`."""
+    version = cache.get_or_set(VERSION_KEY, 0, None)
+    key = f"advertised:{version}:{data['data_type']}:{data['tflite']}:{data['coreml']}"
+    cached = cache.get(key)
+    if cached is None:
+        model = ml_model_for_data_type(data)
+        if model is None:
+            return None
+        body = dict(MLModelSerializer(model).data)
+        digest = sha256(dumps(body, sort_keys=True).encode()).hexdigest()
+        cached = (body, f'"{digest}"')
+        cache.set(key, cached, ADVERTISED_CACHE_TIMEOUT)
+    return cached
+
+
+def invalidate_advertised():
+    """Forget all cached advertised models, e.g., after a model is uploaded."""
+    cache.add(VERSION_KEY, 0, None)
+    cache.incr(VERSION_KEY)
@@ -0,0 +1,58 @@
+"""Streaming weighted average of client parameters."""
+from math import isnan
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+class StreamingFedAvg:
+    """Fold client parameters into per-layer accumulators one at a time,
+    so memory stays proportional to the model instead of
+    the number of clients times the model."""
+
+    def __init__(self) -> None:
+        self.sums: list[NDArray] = []
+        """Weighted sum of each layer, in `float64`."""
+        self.scratch: list[NDArray] = []
+        """Per-layer buffers each client is scaled into before being folded."""
+        self.dtypes: list[np.dtype] = []
+        self.num_examples: float = 0
+        self.num_clients = 0
+
+    def _allocate(self, weights: list[NDArray]):
+        self.sums = [np.zeros(layer.shape, dtype=np.float64) for layer in weights]
+        self.scratch = [np.empty(layer.shape, dtype=np.float64) for layer in weights]
+        self.dtypes = [layer.dtype for layer in weights]
+
+    def add(self, weights: list[NDArray], num_examples: float) -> bool:
+        """Fold `weights` trained on `num_examples`, or any other weight,
+        into the average.
+        Return `False` and leave the average untouched if any layer has NaN
+        or the layers do not match those already folded."""
+        if not self.sums:
+            self._allocate(weights)
+        elif len(weights) != len(self.sums) or any(
+            layer.shape != acc.shape for layer, acc in zip(weights, self.sums)
+        ):
+            return False
+        for layer, scaled in zip(weights, self.scratch):
+            np.multiply(layer, num_examples, out=scaled)
+            # The sum is NaN if any element is NaN (or the layer mixes
+            # opposite infinities, which is as unusable).
+            if isnan(scaled.sum()):
+                return False
+        for acc, scaled in zip(self.sums, self.scratch):
+            acc += scaled
+        self.num_examples += num_examples
+        self.num_clients += 1
+        return True
+
+    def result(self) -> list[NDArray]:
+        """Weighted average of all folded weights,
+        in the dtypes the clients sent."""
+        if self.num_clients == 0 or self.num_examples == 0:
+            raise RuntimeError("StreamingFedAvg: No weights to average.")
+        return [
+            (acc / self.num_examples).astype(dtype, copy=False)
+            for acc, dtype in zip(self.sums, self.dtypes)
+        ]
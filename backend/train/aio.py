@@ -0,0 +1,116 @@
+"""Helpers for async views, which run blocking work, e.g., database queries,
+in a bounded pool of threads instead of a thread per request."""
+from asyncio import Queue, get_running_loop, run_coroutine_threadsafe, wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import loads
+from threading import Event
+from typing import AsyncIterator, Callable, Iterator, TypeVar
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpRequest, JsonResponse
+
+from backend.settings import BLOCKING_THREADS
+
+T = TypeVar("T")
+
+executor = ThreadPoolExecutor(BLOCKING_THREADS, thread_name_prefix="blocking")
+
+
+def _call(fn: Callable[..., T], *args, **kwargs) -> T:
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # As at the end of a request, so pooled threads drop stale connections.
+        close_old_connections()
+
+
+def submit_blocking(fn: Callable[..., T], *args, **kwargs) -> Future[T]:
+    """Call `fn` in `executor`."""
+    return executor.submit(_call, fn, *args, **kwargs)
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Call `fn` in `executor` without blocking the event loop."""
+    return await wrap_future(submit_blocking(fn, *args, **kwargs))
+
+
+async def iterate_blocking(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Advance `iterator`, e.g., reading a file, in `executor` an item at a time."""
+    loop = get_running_loop()
+    end = object()
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, end)
+            if item is end:
+                return
+            yield item  # type: ignore
+    finally:
+        if close := getattr(iterator, "close", None):
+            close()
+
+
+async def iterate_in_thread(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Exhaust `iterator` in one `executor` thread, e.g., because it holds a
+    database cursor, handing items over at most two ahead."""
+    loop = get_running_loop()
+    items: Queue[tuple[bool, object]] = Queue(2)
+    stop = Event()
+
+    def put(more: bool, value: object):
+        run_coroutine_threadsafe(items.put((more, value)), loop).result()
+
+    def produce():
+        try:
+            for item in iterator:
+                put(True, item)
+                if stop.is_set():
+                    return
+            put(False, None)
+        except Exception as err:
+            put(False, err)
+        finally:
+            close_old_connections()
+
+    producer = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            more, value = await items.get()
+            if more:
+                yield value  # type: ignore
+            elif isinstance(value, Exception):
+                raise value
+            else:
+                return
+    finally:
+        # Unblock the producer so it sees `stop` and releases its thread.
+        stop.set()
+        while not items.empty():
+            items.get_nowait()
+        await producer
+
+
+def is_asgi(request: HttpRequest) -> bool:
+    return isinstance(request, ASGIRequest)
+
+
+def streamed(request: HttpRequest, iterator: Iterator, pinned=False):
+    """`iterator` as `StreamingHttpResponse` content. Under ASGI, advanced in
+    `executor` so it neither blocks the event loop nor is buffered whole.
+    `pinned` advances it in a single thread, see `iterate_in_thread`."""
+    if not is_asgi(request):
+        return iterator
+    return iterate_in_thread(iterator) if pinned else iterate_blocking(iterator)
+
+
+def json_body(request: HttpRequest):
+    """Parsed JSON body of `request`, or `None` if it is not JSON."""
+    try:
+        return loads(request.body)
+    except ValueError:
+        return None
+
+
+def respond(data, status=200, headers: dict[str, str] | None = None) -> JsonResponse:
+    """JSON response of any `data`, like DRF's `Response`."""
+    return JsonResponse(data, status=status, headers=headers, safe=False)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class TrainConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "train"
+
+    def ready(self):
+        # Every process, not only those that ever start a Flower server,
+        # so that one of them is always compacting.
+        from train.retention import start_periodic_compaction
+
+        start_periodic_compaction()
@@ -0,0 +1,73 @@
+"""Content-addressed store of parameter checkpoints on disk."""
+import os
+from hashlib import sha256
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from tempfile import mkstemp
+from time import time
+from typing import Iterable
+
+from backend.settings import PARAMS_BLOB_DIR
+
+
+class BlobStore:
+    """Blobs are named by their SHA-256 digest under `root`,
+    so identical blobs are stored once."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def put(self, data) -> tuple[str, int]:
+        """Store `data` if not already stored. Return `(digest, size)`."""
+        view = memoryview(data)
+        digest = sha256(view).hexdigest()
+        path = self.path(digest)
+        if path.exists():
+            # Refresh so garbage collection treats it as new.
+            os.utime(path)
+            return digest, view.nbytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write next to the destination and rename into place so readers
+        # never see a partial blob.
+        fd, tmp = mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(view)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return digest, view.nbytes
+
+    def open(self, digest: str) -> mmap:
+        """Read-only memory map of the blob."""
+        with open(self.path(digest), "rb") as file:
+            return mmap(file.fileno(), 0, access=ACCESS_READ)
+
+    def collect(self, referenced: Iterable[str], grace: float) -> tuple[int, int]:
+        """Delete blobs not in `referenced` and not written in the last
+        `grace` seconds, including temporary files left by failed writes.
+        Return the number of files and bytes freed."""
+        keep = set(referenced)
+        cutoff = time() - grace
+        count, freed = 0, 0
+        for path in self.root.glob("??/*"):
+            if path.parent.name + path.name in keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Renamed or collected concurrently.
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            path.unlink(missing_ok=True)
+            count, freed = count + 1, freed + stat.st_size
+        return count, freed
+
+
+blob_store = BlobStore(PARAMS_BLOB_DIR)
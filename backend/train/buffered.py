@@ -0,0 +1,177 @@
+"""Buffered asynchronous aggregation, FedBuff-style (Nguyen et al., 2022):
+every client trains on the latest parameters whenever it is free, and every
+`buffer_size` updates are averaged into the next version of the parameters,
+each update discounted by how many versions old its parameters were."""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from logging import getLogger
+from time import monotonic, sleep
+from timeit import default_timer
+from typing import TYPE_CHECKING
+
+from flwr.common import Code, FitIns
+from flwr.server.client_manager import ClientManager
+from flwr.server.history import History
+from flwr.server.server import Server, fit_client
+from numpy.typing import NDArray
+from train.aggregate import StreamingFedAvg
+
+if TYPE_CHECKING:
+    from train.run import FedAvgAndroidSave
+
+STALENESS_EXPONENT = 0.5
+POLL_SECONDS = 1.0
+"""How often to look for newly connected clients while all others train."""
+MAX_BACKOFF_SECONDS = 60.0
+"""Longest a client whose `fit` keeps failing waits to be sent another."""
+
+logger = getLogger(__name__)
+
+
+def staleness_weight(staleness: int) -> float:
+    """FedBuff's polynomial discount of an update `staleness` versions old."""
+    return (1 + staleness) ** -STALENESS_EXPONENT
+
+
+class BufferedServer(Server):
+    """Flower server aggregating client updates as they arrive instead of
+    in rounds. Each of `num_rounds` is one new version of the parameters,
+    checkpointed through `FedAvgAndroidSave.signal_save_params`."""
+
+    def __init__(
+        self,
+        *,
+        client_manager: ClientManager,
+        strategy: "FedAvgAndroidSave",
+        buffer_size: int,
+    ) -> None:
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.strategy: "FedAvgAndroidSave" = strategy
+        self.buffer_size = buffer_size
+        self.version = 0
+        self.versions: dict[int, list[NDArray]] = {}
+        """Parameters of the current version and those clients train on."""
+        self.training: dict[Future, tuple[str, int]] = {}
+        """Client ID and version of each pending `fit`."""
+        self.failures: dict[str, tuple[int, float]] = {}
+        """Consecutive failed `fit`s of each client, and when to retry it."""
+        self.buffer = StreamingFedAvg()
+        """Discounted updates since the last version."""
+        self.buffered_examples = 0
+
+    def fit(self, num_rounds: int, timeout: float | None) -> tuple[History, float]:
+        """Aggregate `num_rounds` versions. `timeout` bounds each client's `fit`."""
+        history = History()
+        self.parameters = self._get_initial_parameters(server_round=0, timeout=timeout)
+        self.versions = {0: self.strategy.parameters_to_ndarrays(self.parameters)}
+        start_time = default_timer()
+        executor = ThreadPoolExecutor(self.max_workers)
+        try:
+            while self.version < num_rounds:
+                self.dispatch(executor, timeout)
+                if not self.training:
+                    # No client is connected, or all are backing off.
+                    sleep(POLL_SECONDS)
+                    continue
+                done, _ = wait(
+                    self.training, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    cid, version = self.training.pop(future)
+                    if self.fold(future, version):
+                        self.failures.pop(cid, None)
+                    else:
+                        self.back_off(cid)
+                self.forget_versions()
+                if self.buffer.num_clients >= self.buffer_size:
+                    self.advance()
+                    history.add_metrics_distributed_fit(
+                        server_round=self.version, metrics={}
+                    )
+        finally:
+            # Do not wait for clients still training on outdated parameters.
+            executor.shutdown(wait=False, cancel_futures=True)
+        return history, default_timer() - start_time
+
+    def dispatch(self, executor: ThreadPoolExecutor, timeout: float | None):
+        """Have every idle client not backing off train on the current version."""
+        busy = {cid for cid, _ in self.training.values()}
+        clients = self._client_manager.all()
+        for cid in self.failures.keys() - clients.keys():
+            del self.failures[cid]
+        now = monotonic()
+        ins = None
+        for cid, client in clients.items():
+            if cid in busy or self.failures.get(cid, (0, now))[1] > now:
+                continue
+            if ins is None:
+                config_fn = self.strategy.on_fit_config_fn
+                config = {} if config_fn is None else config_fn(self.version + 1)
+                ins = FitIns(self.parameters, config)
+            future = executor.submit(fit_client, client, ins, timeout, self.version)
+            self.training[future] = (cid, self.version)
+
+    def fold(self, future: Future, version: int) -> bool:
+        """Fold the update of a finished `fit` on `version` into `buffer`.
+        Return whether it was valid."""
+        try:
+            client, fit_res = future.result()
+        except Exception as err:
+            logger.error(f"BufferedServer: fit failed: {err}")
+            return False
+        if fit_res.status.code != Code.OK or fit_res.num_examples <= 0:
+            logger.error(f"BufferedServer: fit failed on {client}: {fit_res.status}")
+            return False
+        try:
+            weights = self.strategy.parameters_to_ndarrays(fit_res.parameters)
+        except ValueError as err:
+            logger.error(f"BufferedServer: disgarding weights from {client}: {err}")
+            return False
+        base = self.versions[version]
+        if len(weights) != len(base) or any(
+            layer.shape != old.shape for layer, old in zip(weights, base)
+        ):
+            logger.error(f"BufferedServer: disgarding mismatched layers from {client}.")
+            return False
+        update = [layer - old for layer, old in zip(weights, base)]
+        weight = fit_res.num_examples * staleness_weight(self.version - version)
+        if not self.buffer.add(update, weight):
+            logger.error(f"BufferedServer: disgarding weights with NaN from {client}.")
+            return False
+        self.buffered_examples += fit_res.num_examples
+        return True
+
+    def back_off(self, cid: str):
+        """Wait exponentially longer to retry client `cid` each time it fails."""
+        failures = self.failures.get(cid, (0, 0.0))[0] + 1
+        delay = min(POLL_SECONDS * 2 ** (failures - 1), MAX_BACKOFF_SECONDS)
+        self.failures[cid] = (failures, monotonic() + delay)
+
+    def advance(self):
+        """Apply the buffered updates as the next version and checkpoint it."""
+        # Undo the normalization by discounted weights so stale updates
+        # move the parameters less, rather than only relative to fresh ones.
+        scale = self.buffer.num_examples / self.buffered_examples
+        update = self.buffer.result()
+        current = self.versions[self.version]
+        params = [
+            (old + scale * change).astype(old.dtype, copy=False)
+            for old, change in zip(current, update)
+        ]
+        self.version += 1
+        self.versions[self.version] = params
+        self.parameters = self.strategy.ndarrays_to_parameters(params)
+        logger.warning(
+            f"BufferedServer: version {self.version} from \
+{self.buffer.num_clients} updates."
+        )
+        self.buffer = StreamingFedAvg()
+        self.buffered_examples = 0
+        self.forget_versions()
+        self.strategy.signal_save_params(params)
+
+    def forget_versions(self):
+        needed = {version for _, version in self.training.values()}
+        needed.add(self.version)
+        for version in list(self.versions):
+            if version not in needed:
+                del self.versions[version]
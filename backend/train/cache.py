@@ -0,0 +1,65 @@
+"""Process-wide cache of decoded parameters."""
+from collections import OrderedDict
+from threading import Lock
+
+from numpy.typing import NDArray
+
+from backend.settings import PARAMS_CACHE_BYTES
+
+
+class ParamsCache:
+    """Least recently used decoded parameters keyed by
+    `(MLModel ID, ModelParams ID)`, holding at most `budget` bytes."""
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.entries: OrderedDict[tuple[int, int], list[NDArray]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, model_id: int, params_id: int) -> list[NDArray] | None:
+        with self.lock:
+            arrays = self.entries.get((model_id, params_id))
+            if arrays is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end((model_id, params_id))
+            self.hits += 1
+            return arrays
+
+    def put(self, model_id: int, params_id: int, arrays: list[NDArray]):
+        """Cache `arrays`, which are made read-only since they are shared."""
+        size = sum(array.nbytes for array in arrays)
+        if size > self.budget:
+            return
+        for array in arrays:
+            array.flags.writeable = False
+        with self.lock:
+            key = (model_id, params_id)
+            if key in self.entries:
+                return
+            self.entries[key] = arrays
+            self.size += size
+            while self.size > self.budget:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= sum(array.nbytes for array in evicted)
+
+    def invalidate(self, model_id: int):
+        """Drop every cached entry of `model_id`."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == model_id]:
+                self.size -= sum(array.nbytes for array in self.entries.pop(key))
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+
+params_cache = ParamsCache(PARAMS_CACHE_BYTES)
@@ -0,0 +1,81 @@
+"""Saving parameter checkpoints, as keyframes or deltas against them."""
+from logging import getLogger
+
+from telemetry.models import TrainingSession
+from train.blobs import blob_store
+from train.cache import params_cache
+from train.codec import decode_params, encode_params, read_layout
+from train.delta import FULL, encode_delta
+from train.models import MLModel, ModelParams, keyframe_params
+
+from backend.settings import (
+    PARAMS_DELTA,
+    PARAMS_DELTA_MAX_ERROR,
+    PARAMS_KEYFRAME_INTERVAL,
+)
+
+logger = getLogger(__name__)
+
+
+def same_layout(a: list[dict], b: list[dict]) -> bool:
+    return len(a) == len(b) and all(
+        x["dtype"] == y["dtype"] and x["shape"] == y["shape"] for x, y in zip(a, b)
+    )
+
+
+def save_delta(
+    model: MLModel, data, layout: list[dict], session: TrainingSession | None
+) -> ModelParams | None:
+    """Store `data` as a delta against `model`'s last keyframe if the
+    keyframe interval allows and the quantization error is within bounds."""
+    keyframes = model.params.filter(encoding=FULL)  # type: ignore
+    keyframe: ModelParams | None = keyframes.last()
+    if keyframe is None or keyframe.layout is None:
+        return None
+    if keyframe.deltas.count() + 1 >= PARAMS_KEYFRAME_INTERVAL:  # type: ignore
+        return None
+    if not same_layout(layout, keyframe.layout):
+        return None
+    arrays, error = encode_delta(
+        decode_params(data, layout), keyframe_params(keyframe.id), PARAMS_DELTA
+    )
+    if error > PARAMS_DELTA_MAX_ERROR:
+        logger.warning(
+            f"Delta for {model.name} is off by up to {error}, storing keyframe."
+        )
+        return None
+    delta = encode_params(arrays)
+    digest, size = blob_store.put(delta)
+    params = ModelParams(
+        tflite_model=model,
+        digest=digest,
+        size=size,
+        layout=read_layout(delta),
+        encoding=PARAMS_DELTA,
+        keyframe=keyframe,
+        error_bound=error,
+        session=session,
+    )
+    params.save()
+    return params
+
+
+def save_params(
+    model: MLModel, data, session: TrainingSession | None = None
+) -> ModelParams:
+    """Store `data` in the `codec` stored format as a checkpoint for `model`
+    produced by `session`.
+    The blob is written before the row, outside any database transaction.
+    Raise `ValueError` if `data` is not in the stored format."""
+    layout = read_layout(data)
+    params_cache.invalidate(model.id)
+    if PARAMS_DELTA is not None:
+        params = save_delta(model, data, layout, session)
+        if params is not None:
+            return params
+    digest, size = blob_store.put(data)
+    params = ModelParams(
+        tflite_model=model, digest=digest, size=size, layout=layout, session=session
+    )
+    params.save()
+    return params
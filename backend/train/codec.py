@@ -0,0 +1,129 @@
+"""Conversion between parameter tensors on the wire and NumPy arrays,
+and the binary format parameters are stored in."""
+from json import dumps, loads
+from struct import Struct
+from typing import Sequence
+
+import numpy as np
+from flwr.common import Parameters
+from numpy.typing import NDArray
+
+DTYPE = np.dtype(np.float32)
+"""Clients send every layer as raw little-endian `float32`."""
+TENSOR_TYPE = "numpy.ndarray"
+
+
+def check_layers(sizes: Sequence[int], layers: Sequence[int] | None):
+    """Raise `ValueError` if the byte `sizes` of the tensors do not match
+    the layer manifest `layers`, e.g. `MLModel.tflite_layers`."""
+    if layers is None:
+        return
+    if len(sizes) != len(layers):
+        raise ValueError(f"Got {len(sizes)} layers but expected {len(layers)}.")
+    for index, (size, expected) in enumerate(zip(sizes, layers)):
+        if size != expected:
+            raise ValueError(f"Layer {index} has {size} bytes but expected {expected}.")
+
+
+def tensors_to_ndarrays(
+    tensors: Sequence[bytes | memoryview],
+    layers: Sequence[int] | None = None,
+    dtype: np.dtype = DTYPE,
+) -> list[NDArray]:
+    """Read-only views of `tensors` as `dtype` arrays, without copying.
+    `layers` is the manifest of byte sizes to validate against."""
+    check_layers([memoryview(tensor).nbytes for tensor in tensors], layers)
+    return [np.frombuffer(tensor, dtype=dtype) for tensor in tensors]
+
+
+def ndarrays_to_tensors(
+    arrays: Sequence[NDArray], layers: Sequence[int] | None = None
+) -> list[bytes]:
+    """Raw bytes of each array, validated against `layers`.
+    Protobuf only accepts `bytes`, so this is the one copy made."""
+    check_layers([array.nbytes for array in arrays], layers)
+    return [array.tobytes() for array in arrays]
+
+
+def ndarrays_to_parameters(
+    arrays: Sequence[NDArray], layers: Sequence[int] | None = None
+) -> Parameters:
+    return Parameters(ndarrays_to_tensors(arrays, layers), tensor_type=TENSOR_TYPE)
+
+
+# Stored format: `MAGIC`, `HEADER` (version and JSON length), then the JSON
+# layout `[{dtype, shape, offset}]` of each layer. Layer data follow from the
+# next `ALIGNMENT` boundary, each layer aligned to `ALIGNMENT`, so any layer
+# can be `np.memmap`ed or `np.frombuffer`ed in place.
+MAGIC = b"FKPARAMS"
+HEADER = Struct("<II")
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _count(layer: dict) -> int:
+    return int(np.prod(layer["shape"], dtype=np.int64))
+
+
+def is_encoded(buffer) -> bool:
+    return bytes(buffer[: len(MAGIC)]) == MAGIC
+
+
+def encode_params(arrays: Sequence[NDArray]) -> bytearray:
+    """Encode `arrays` into the stored format."""
+    layout, offset = [], 0
+    for array in arrays:
+        layout.append(
+            {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        )
+        offset = _align(offset + array.nbytes)
+    header = dumps(layout, separators=(",", ":")).encode()
+    header_end = len(MAGIC) + HEADER.size + len(header)
+    data_start = _align(header_end)
+    buffer = bytearray(data_start + offset)
+    buffer[: len(MAGIC)] = MAGIC
+    HEADER.pack_into(buffer, len(MAGIC), VERSION, len(header))
+    buffer[header_end - len(header) : header_end] = header
+    for layer, array in zip(layout, arrays):
+        view = np.frombuffer(
+            buffer, array.dtype, count=array.size, offset=data_start + layer["offset"]
+        )
+        view[:] = array.ravel()
+    return buffer
+
+
+def read_layout(buffer) -> list[dict]:
+    """Layout of each layer in stored `buffer`,
+    with `offset` counted from the start of `buffer`.
+    Raise `ValueError` if `buffer` is not in the stored format."""
+    if not is_encoded(buffer):
+        raise ValueError("Parameters are not in the stored format.")
+    version, length = HEADER.unpack_from(buffer, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Unsupported parameters format version {version}.")
+    header_end = len(MAGIC) + HEADER.size + length
+    layout = loads(bytes(buffer[header_end - length : header_end]))
+    data_start = _align(header_end)
+    for layer in layout:
+        layer["offset"] += data_start
+        end = layer["offset"] + np.dtype(layer["dtype"]).itemsize * _count(layer)
+        if end > len(buffer):
+            raise ValueError("Parameters are truncated.")
+    return layout
+
+
+def decode_params(buffer, layout: list[dict] | None = None) -> list[NDArray]:
+    """Views of each layer in stored `buffer`, without copying.
+    `layout` is from `read_layout` if already known."""
+    if layout is None:
+        layout = read_layout(buffer)
+    return [
+        np.frombuffer(
+            buffer, layer["dtype"], count=_count(layer), offset=layer["offset"]
+        ).reshape(layer["shape"])
+        for layer in layout
+    ]
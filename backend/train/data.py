@@ -8,3 +8,5 @@ class ServerData:
     status: str
     session_id: int | None
     port: int | None
+    queue_position: int | None = None
+    """Position in the queue for a server if `status` is "queued"."""
@@ -0,0 +1,57 @@
+"""Quantized deltas of parameters against a keyframe."""
+import numpy as np
+from numpy.typing import NDArray
+
+FULL = "full"
+FP16 = "fp16"
+INT8 = "int8"
+ENCODINGS = [FULL, FP16, INT8]
+INT8_MAX = 127
+
+
+def encode_delta(
+    params: list[NDArray], keyframe: list[NDArray], encoding: str
+) -> tuple[list[NDArray], float]:
+    """Encode `params - keyframe` as `encoding`.
+    Return the arrays to store and the largest absolute error of any
+    parameter `decode_delta` rebuilds from them, rounding included."""
+    arrays: list[NDArray] = []
+    scales: list[float] = []
+    for layer, base in zip(params, keyframe):
+        delta = np.subtract(layer, base, dtype=np.float32)
+        if encoding == FP16:
+            quantized = delta.astype(np.float16)
+        elif encoding == INT8:
+            peak = float(np.abs(delta).max(initial=0.0))
+            scale = peak / INT8_MAX if peak > 0 else 1.0
+            quantized = np.rint(delta / scale).astype(np.int8)
+            scales.append(scale)
+        else:
+            raise ValueError(f"Unknown delta encoding `{encoding}`.")
+        arrays.append(quantized)
+    if encoding == INT8:
+        arrays.append(np.array(scales, dtype=np.float32))
+    error = 0.0
+    for rebuilt, layer in zip(decode_delta(arrays, keyframe, encoding), params):
+        if rebuilt.size:
+            difference = np.subtract(rebuilt, layer, dtype=np.float64)
+            error = max(error, float(np.abs(difference).max()))
+    return arrays, error
+
+
+def decode_delta(
+    arrays: list[NDArray], keyframe: list[NDArray], encoding: str
+) -> list[NDArray]:
+    """Rebuild parameters from `keyframe` and arrays from `encode_delta`."""
+    if encoding == FP16:
+        return [
+            np.add(base, delta, dtype=base.dtype)
+            for delta, base in zip(arrays, keyframe)
+        ]
+    elif encoding == INT8:
+        *deltas, scales = arrays
+        return [
+            np.add(base, delta * scale, dtype=base.dtype)
+            for delta, scale, base in zip(deltas, scales, keyframe)
+        ]
+    raise ValueError(f"Unknown delta encoding `{encoding}`.")
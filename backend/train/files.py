@@ -0,0 +1,151 @@
+"""Serving model files with precompressed variants and byte ranges."""
+import gzip
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+from shutil import copyfileobj
+from tempfile import mkstemp
+from typing import IO, Iterator
+
+from backend.settings import BASE_DIR
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 256 * 1024
+ENCODINGS = {"zstd": ".zst", "gzip": ".gz"}
+"""`Content-Encoding` of each precompressed variant and its file suffix,
+in order of preference."""
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+"""Process umask, for files to get the permissions `open` would give them."""
+
+
+def model_file_path(path: str) -> Path:
+    """File of `MLModel.tflite_path` or `coreml_path`."""
+    return BASE_DIR / path.lstrip("/")
+
+
+def write_atomically(path: Path, write):
+    """Call `write` with a temporary file next to `path` and
+    rename it to `path` if `write` succeeds."""
+    fd, tmp = mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            # Not `mkstemp`'s 0600, so whatever serves static files can read it.
+            os.fchmod(file.fileno(), 0o666 & ~UMASK)
+            write(file)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save_streaming(path: Path, src: IO, max_size: int) -> tuple[str, int]:
+    """Copy `src` to `path` in chunks, atomically. Return its SHA-256 and size.
+    Raise `ValueError` if it is larger than `max_size` bytes."""
+    hash, size = sha256(), 0
+
+    def write(out: IO):
+        nonlocal size
+        while chunk := src.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise ValueError(f"File larger than {max_size} bytes.")
+            hash.update(chunk)
+            out.write(chunk)
+
+    write_atomically(path, write)
+    return hash.hexdigest(), size
+
+
+def precompress(path: Path):
+    """Write the gzip, and zstd if available, variants next to `path`."""
+
+    def write_gzip(out: IO):
+        with open(path, "rb") as src, gzip.GzipFile(
+            fileobj=out, mode="wb", mtime=0
+        ) as dst:
+            copyfileobj(src, dst, CHUNK_SIZE)
+
+    write_atomically(path.with_name(path.name + ENCODINGS["gzip"]), write_gzip)
+    if zstandard is not None:
+
+        def write_zstd(out: IO):
+            with open(path, "rb") as src:
+                zstandard.ZstdCompressor().copy_stream(src, out)
+
+        write_atomically(path.with_name(path.name + ENCODINGS["zstd"]), write_zstd)
+
+
+def remove_with_variants(path: Path):
+    """Remove `path` and its precompressed variants, whichever exist."""
+    for suffix in ["", *ENCODINGS.values()]:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Codings `Accept-Encoding` allows, ignoring those with `q=0`."""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def negotiate(path: Path, accept_encoding: str) -> tuple[Path, str | None]:
+    """Precompressed variant of `path` to send for `Accept-Encoding`
+    and its `Content-Encoding`, or `path` itself and `None`."""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, suffix in ENCODINGS.items():
+        if encoding in accepted or "*" in accepted:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                return variant, encoding
+    return path, None
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Inclusive `(start, end)` of a single-range `Range` header.
+    Return `None` if there is no single range to honor, and raise
+    `ValueError` if the range cannot be satisfied."""
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes.")
+    return start, end
+
+
+def read_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Stream bytes `start` to `end` inclusive of `path`."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
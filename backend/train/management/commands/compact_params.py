@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from train.retention import compact
+
+
+class Command(BaseCommand):
+    help = "Delete checkpoints outside each model's retention policy \
+and unreferenced checkpoint blobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Also VACUUM the SQLite database to shrink its file.",
+        )
+
+    def handle(self, *args, **options):
+        deleted, blobs, freed = compact(vacuum=options["vacuum"])
+        self.stdout.write(
+            f"Deleted {deleted} checkpoints and {blobs} blobs, freed {freed} bytes."
+        )
@@ -0,0 +1,30 @@
+from pickle import dumps, loads
+
+from django.db import migrations
+from train.codec import decode_params, encode_params, is_encoded
+
+
+def encode_pickled_params(apps, _):
+    ModelParams = apps.get_model("train", "ModelParams")
+    for row in ModelParams.objects.only("id", "params").iterator(chunk_size=16):
+        if not is_encoded(row.params):
+            row.params = bytes(encode_params(loads(row.params)))
+            row.save(update_fields=["params"])
+
+
+def pickle_encoded_params(apps, _):
+    ModelParams = apps.get_model("train", "ModelParams")
+    for row in ModelParams.objects.only("id", "params").iterator(chunk_size=16):
+        if is_encoded(row.params):
+            row.params = dumps([layer.copy() for layer in decode_params(row.params)])
+            row.save(update_fields=["params"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("train", "0002_rename_tflitemodel_mlmodel_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(encode_pickled_params, pickle_encoded_params),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations, models
+from train.blobs import blob_store
+from train.codec import read_layout
+
+
+def move_params_to_blobs(apps, _):
+    ModelParams = apps.get_model("train", "ModelParams")
+    rows = ModelParams.objects.filter(digest=None).only("id", "params")
+    for row in rows.iterator(chunk_size=16):
+        data = bytes(row.params)
+        row.layout = read_layout(data)
+        row.digest, row.size = blob_store.put(data)
+        row.params = b""
+        row.save(update_fields=["params", "digest", "size", "layout"])
+
+
+def move_params_from_blobs(apps, _):
+    ModelParams = apps.get_model("train", "ModelParams")
+    rows = ModelParams.objects.exclude(digest=None).only("id", "digest")
+    for row in rows.iterator(chunk_size=16):
+        row.params = blob_store.path(row.digest).read_bytes()
+        row.save(update_fields=["params"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("train", "0003_encode_modelparams"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelparams",
+            name="digest",
+            field=models.CharField(
+                db_index=True, default=None, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="size",
+            field=models.BigIntegerField(default=None, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="layout",
+            field=models.JSONField(default=None, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="modelparams",
+            name="params",
+            field=models.BinaryField(default=b"", editable=False),
+        ),
+        migrations.RunPython(move_params_to_blobs, move_params_from_blobs),
+    ]
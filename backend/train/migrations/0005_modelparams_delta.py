@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("train", "0004_modelparams_blob_store"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelparams",
+            name="encoding",
+            field=models.CharField(
+                choices=[("full", "full"), ("fp16", "fp16"), ("int8", "int8")],
+                default="full",
+                editable=False,
+                max_length=8,
+            ),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="keyframe",
+            field=models.ForeignKey(
+                default=None,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deltas",
+                to="train.modelparams",
+            ),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="error_bound",
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("telemetry", "0002_alter_evaluateinstelemetrydata_device_id_and_more"),
+        ("train", "0005_modelparams_delta"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mlmodel",
+            name="retention",
+            field=models.JSONField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="session",
+            field=models.ForeignKey(
+                default=None,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="params",
+                to="telemetry.trainingsession",
+            ),
+        ),
+        migrations.AddField(
+            model_name="modelparams",
+            name="created",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
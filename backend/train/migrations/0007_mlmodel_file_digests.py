@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("train", "0006_modelparams_session_created_mlmodel_retention"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mlmodel",
+            name="tflite_digest",
+            field=models.CharField(default=None, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="mlmodel",
+            name="coreml_digest",
+            field=models.CharField(default=None, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="mlmodel",
+            name="tflite_size",
+            field=models.BigIntegerField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="mlmodel",
+            name="coreml_size",
+            field=models.BigIntegerField(default=None, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("telemetry", "0004_telemetry_bucket_and_indexes"),
+        ("train", "0007_mlmodel_file_digests"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlowerServer",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "port",
+                    models.IntegerField(default=None, null=True, unique=True),
+                ),
+                ("pid", models.IntegerField(default=None, null=True)),
+                ("start_fresh", models.BooleanField(default=False)),
+                ("heartbeat", models.DateTimeField()),
+                (
+                    "session",
+                    models.ForeignKey(
+                        default=None,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="telemetry.trainingsession",
+                    ),
+                ),
+                (
+                    "tflite_model",
+                    models.OneToOneField(
+                        editable=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flower_server",
+                        to="train.mlmodel",
+                    ),
+                ),
+            ],
+        ),
+    ]
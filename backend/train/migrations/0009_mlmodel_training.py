@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("train", "0008_flowerserver"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mlmodel",
+            name="training",
+            field=models.JSONField(default=None, null=True),
+        ),
+    ]
@@ -1,7 +1,14 @@
+from functools import lru_cache
 from pickle import loads
 
 from django.db import models
 from numpy.typing import NDArray
+from train.blobs import blob_store
+from train.cache import params_cache
+from train.codec import decode_params, is_encoded
+from train.delta import ENCODINGS, FULL, decode_delta
+
+from backend.settings import TRAINING_CONFIG
 
 
 class TrainingDataType(models.Model):
@@ -20,6 +27,14 @@ class MLModel(models.Model):
     """Path to `.tflite` file."""
     coreml_path = models.CharField(max_length=64, unique=True, null=True, default=None)
     """Path to `.mlmodel` file."""
+    tflite_digest = models.CharField(max_length=64, null=True, default=None)
+    """SHA-256 of the `.tflite` file."""
+    coreml_digest = models.CharField(max_length=64, null=True, default=None)
+    """SHA-256 of the `.mlmodel` file."""
+    tflite_size = models.BigIntegerField(null=True, default=None)
+    """Size of the `.tflite` file in bytes."""
+    coreml_size = models.BigIntegerField(null=True, default=None)
+    """Size of the `.mlmodel` file in bytes."""
     tflite_layers = models.JSONField(null=True, default=None)
     """Size of each layer of parameters in bytes."""
     coreml_layers = models.JSONField(null=True, default=None)
@@ -34,6 +49,16 @@ class MLModel(models.Model):
     )
     tflite = models.BooleanField(default=True)
     coreml = models.BooleanField(default=False)
+    retention = models.JSONField(null=True, default=None)
+    """Checkpoint retention policy `{keep_last, per_session, per_day}`,
+    or `None` for `settings.PARAMS_RETENTION`. See `retention.policy_keeps`."""
+    training = models.JSONField(null=True, default=None)
+    """`serializers.TrainingConfigSerializer` data,
+    or `None` for `settings.TRAINING_CONFIG`. See `training_config`."""
+
+    def training_config(self) -> dict:
+        """`training` filled in with `settings.TRAINING_CONFIG`."""
+        return {**TRAINING_CONFIG, **(self.training or {})}
 
     def __str__(self) -> str:
         desc = [f"MLModel {self.name} for {self.data_type.name}"]
@@ -51,7 +76,46 @@ class MLModel(models.Model):
 
 
 class ModelParams(models.Model):
-    params = models.BinaryField(editable=False)
+    params = models.BinaryField(editable=False, default=b"")
+    """Parameters in the `codec` stored format,
+    or pickled `list[NDArray]` for rows from before it.
+    Empty if stored in `blob_store` under `digest`."""
+    digest = models.CharField(
+        max_length=64, null=True, default=None, editable=False, db_index=True
+    )
+    """SHA-256 of the parameters in `blob_store`."""
+    size = models.BigIntegerField(null=True, default=None, editable=False)
+    """Size of the blob in bytes."""
+    layout = models.JSONField(null=True, default=None, editable=False)
+    """`codec.read_layout` of the blob."""
+    encoding = models.CharField(
+        max_length=8,
+        choices=[(encoding, encoding) for encoding in ENCODINGS],
+        default=FULL,
+        editable=False,
+    )
+    """`"full"` for keyframes, otherwise how the delta against
+    `keyframe` is quantized."""
+    keyframe = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        related_name="deltas",
+        null=True,
+        default=None,
+        editable=False,
+    )
+    error_bound = models.FloatField(default=0.0, editable=False)
+    """Largest absolute error of any parameter introduced by quantization."""
+    session = models.ForeignKey(
+        "telemetry.TrainingSession",
+        on_delete=models.SET_NULL,
+        related_name="params",
+        null=True,
+        default=None,
+        editable=False,
+    )
+    """Training session that produced these parameters."""
+    created = models.DateTimeField(auto_now_add=True)
     tflite_model = models.ForeignKey(
         MLModel,
         on_delete=models.CASCADE,
@@ -60,7 +124,64 @@ class ModelParams(models.Model):
     )
 
     def decode_params(self) -> list[NDArray]:
+        if self.encoding != FULL:
+            keyframe = keyframe_params(self.keyframe_id)  # type: ignore
+            arrays = decode_params(blob_store.open(self.digest), self.layout)
+            return decode_delta(arrays, keyframe, self.encoding)
+        if self.digest is not None:
+            return decode_params(blob_store.open(self.digest), self.layout)
+        if is_encoded(self.params):
+            return decode_params(self.params)
         return loads(self.params)
 
+    def cached_params(self) -> list[NDArray]:
+        """Read-only `decode_params` through `params_cache`."""
+        model_id: int = self.tflite_model_id  # type: ignore
+        arrays = params_cache.get(model_id, self.id)  # type: ignore
+        if arrays is None:
+            arrays = self.decode_params()
+            params_cache.put(model_id, self.id, arrays)  # type: ignore
+        return arrays
+
     def __str__(self) -> str:
-        return f"ModelParams for {self.tflite_model.name}: {self.decode_params()}"
+        return f"ModelParams for {self.tflite_model.name}: {self.cached_params()}"
+
+
+class FlowerServer(models.Model):
+    """A running Flower server, or a model queued for one, shared by all web
+    worker processes. See `scheduler.server`."""
+
+    tflite_model = models.OneToOneField(
+        MLModel,
+        on_delete=models.CASCADE,
+        related_name="flower_server",
+        editable=False,
+    )
+    port = models.IntegerField(unique=True, null=True, default=None)
+    """Port the server listens on, or `None` while queued."""
+    pid = models.IntegerField(null=True, default=None)
+    """ID of the Flower server process."""
+    start_fresh = models.BooleanField(default=False)
+    session = models.ForeignKey(
+        "telemetry.TrainingSession",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        default=None,
+    )
+    heartbeat = models.DateTimeField()
+    """When the web worker running the server last saw it alive,
+    or when the queued model last asked for a server."""
+
+    def __str__(self) -> str:
+        if self.port is None:
+            return f"FlowerServer queued for {self.tflite_model_id}"  # type: ignore
+        return f"FlowerServer {self.pid} for {self.tflite_model_id} \
+on {self.port}"  # type: ignore
+
+
+@lru_cache(maxsize=8)
+def keyframe_params(id: int) -> list[NDArray]:
+    """Decoded keyframe `ModelParams`, cached because deltas are rebuilt on it.
+    Keyframes are never modified, so the cache needs no invalidation."""
+    return ModelParams.objects.get(pk=id).decode_params()
@@ -0,0 +1,127 @@
+"""Thinning out old parameter checkpoints and reclaiming their space."""
+from fcntl import LOCK_EX, LOCK_NB, flock
+from logging import getLogger
+from threading import Lock, Thread
+from time import sleep
+
+from django.db import close_old_connections, connection
+from train.blobs import blob_store
+from train.models import MLModel, ModelParams
+
+from backend.settings import (
+    PARAMS_BLOB_DIR,
+    PARAMS_BLOB_GRACE,
+    PARAMS_RETENTION,
+    PARAMS_RETENTION_INTERVAL,
+)
+
+BATCH_SIZE = 500
+LOCK_PATH = PARAMS_BLOB_DIR / ".compaction.lock"
+"""Locked by the one process that compacts periodically.
+Outside the blob directories, so never collected."""
+
+logger = getLogger(__name__)
+
+
+def policy_keeps(policy: dict, rows: list[tuple]) -> set[int]:
+    """IDs to keep among `rows` of `(id, session_id, created, keyframe_id)`
+    in ascending ID order, according to `policy`:
+    - `keep_last`: keep this many latest checkpoints; `None` keeps all.
+    - `per_session`: keep the latest checkpoint of each session.
+    - `per_day`: keep the latest checkpoint of each day.
+    The latest checkpoint and the keyframes of kept deltas are always kept."""
+    keep_last = policy.get("keep_last")
+    if keep_last is None:
+        return {row[0] for row in rows}
+    keep = {row[0] for row in rows[-max(keep_last, 1) :]}
+    latest_per_session: dict[int, int] = {}
+    latest_per_day: dict = {}
+    for id, session_id, created, _ in rows:
+        if session_id is not None:
+            latest_per_session[session_id] = id
+        latest_per_day[created.date()] = id
+    if policy.get("per_session"):
+        keep.update(latest_per_session.values())
+    if policy.get("per_day"):
+        keep.update(latest_per_day.values())
+    keep.update(
+        keyframe_id
+        for id, _, _, keyframe_id in rows
+        if id in keep and keyframe_id is not None
+    )
+    return keep
+
+
+def compact_model(model: MLModel) -> int:
+    """Delete `model`'s checkpoints its retention policy does not keep,
+    in batches. Return the number deleted."""
+    policy = PARAMS_RETENTION if model.retention is None else model.retention
+    rows = list(
+        ModelParams.objects.filter(tflite_model=model)
+        .order_by("id")
+        .values_list("id", "session_id", "created", "keyframe_id")
+    )
+    keep = policy_keeps(policy, rows)
+    to_delete = [row[0] for row in rows if row[0] not in keep]
+    for start in range(0, len(to_delete), BATCH_SIZE):
+        batch = to_delete[start : start + BATCH_SIZE]
+        ModelParams.objects.filter(id__in=batch).delete()
+    if to_delete:
+        logger.warning(f"Deleted {len(to_delete)} checkpoints of {model.name}.")
+    return len(to_delete)
+
+
+def collect_blobs() -> tuple[int, int]:
+    """Delete blobs no checkpoint refers to."""
+    referenced = (
+        ModelParams.objects.exclude(digest=None)
+        .values_list("digest", flat=True)
+        .distinct()
+        .iterator()
+    )
+    return blob_store.collect(referenced, PARAMS_BLOB_GRACE)
+
+
+def compact(vacuum=False) -> tuple[int, int, int]:
+    """Apply every model's retention policy and collect unreferenced blobs.
+    `vacuum` also rebuilds the SQLite database to shrink its file.
+    Return the number of checkpoints deleted, blobs deleted, and bytes freed."""
+    deleted = sum(compact_model(model) for model in MLModel.objects.all())
+    blobs, freed = collect_blobs()
+    if vacuum and connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+    return deleted, blobs, freed
+
+
+def compact_periodically(interval: int):
+    """`compact` every `interval` seconds if this process holds the lock on
+    `LOCK_PATH`, which it keeps once taken, so that of all the processes
+    only one compacts, and another takes over if it exits."""
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    lock = open(LOCK_PATH, "a")
+    while True:
+        sleep(interval)
+        try:
+            flock(lock.fileno(), LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            continue
+        try:
+            compact()
+        except Exception as err:
+            logger.error(f"compact_periodically: {err}")
+        finally:
+            close_old_connections()
+
+
+_started = Lock()
+
+
+def start_periodic_compaction():
+    """Start `compact_periodically` every `PARAMS_RETENTION_INTERVAL` seconds
+    in a daemon thread, once per process."""
+    if PARAMS_RETENTION_INTERVAL is None or not _started.acquire(blocking=False):
+        return
+    Thread(
+        target=compact_periodically, args=(PARAMS_RETENTION_INTERVAL,), daemon=True
+    ).start()
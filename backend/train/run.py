@@ -1,21 +1,42 @@
 """`fig_config` and code in `server` are copied from Flower Android example."""
-import pickle
 from logging import getLogger
+from mmap import ACCESS_READ, mmap
+from multiprocessing.connection import Connection
 
-import requests
-from flwr.common import FitRes, Parameters, Scalar
+from flwr.common import EvaluateIns, FitRes, Parameters, Scalar
 from flwr.server import ServerConfig, start_server
+from flwr.server.client_manager import ClientManager, SimpleClientManager
 from flwr.server.client_proxy import ClientProxy
 from flwr.server.strategy import FedAvgAndroid
-from flwr.server.strategy.aggregate import aggregate
-from numpy import isnan
 from numpy.typing import NDArray
+from train.aggregate import StreamingFedAvg
+from train.buffered import BufferedServer
+from train.codec import (
+    decode_params,
+    encode_params,
+    ndarrays_to_parameters,
+    tensors_to_ndarrays,
+)
+from train.shm import attached, publish
+
+from backend.settings import TRAINING_CONFIG
 
 logger = getLogger(__name__)
 
 
 class FedAvgAndroidSave(FedAvgAndroid):
-    coreml = False
+    channel: Connection | None = None
+    """Pipe to the scheduler to hand checkpoints over."""
+    layers: list[int] | None = None
+    """Byte size of each layer to validate client parameters against."""
+    quorum = 1
+    """Fewest results to aggregate a round from,
+    e.g., after `round_timeout` cut stragglers off."""
+    evaluate_every = 1
+    """Evaluate every this many rounds, or never if 0."""
+
+    def parameters_to_ndarrays(self, parameters: Parameters) -> list[NDArray]:
+        return tensors_to_ndarrays(parameters.tensors, self.layers)
 
     def aggregate_fit(
         self,
@@ -31,69 +52,146 @@ class FedAvgAndroidSave(FedAvgAndroid):
         # Do not aggregate if there are failures and failures are not accepted
         if not self.accept_failures and failures:
             return None, {}
-        # Convert results
-        weights_results = []
+        if len(results) < self.quorum:
+            logger.warning(
+                f"aggregate_fit: {len(results)} results are short of \
+quorum {self.quorum}, keeping parameters."
+            )
+            return None, {}
+        # Fold each result in as soon as it is decoded instead of
+        # collecting every client's weights first.
+        average = StreamingFedAvg()
         for client, fit_res in results:
-            weights = self.parameters_to_ndarrays(fit_res.parameters)
-            if any(isnan(weight).any() for weight in weights):
+            try:
+                weights = self.parameters_to_ndarrays(fit_res.parameters)
+            except ValueError as err:
+                logger.error(f"aggregate_fit: disgarding weights from {client}: {err}")
+                continue
+            if not average.add(weights, fit_res.num_examples):
                 logger.error(
-                    f"aggregate_fit: disgarding weights with NaN from {client}: \
-{weights}."
+                    f"aggregate_fit: disgarding weights with NaN or mismatched \
+layers from {client}: {weights}."
                 )
-            else:
-                weights_results.append((weights, fit_res.num_examples))
-        if weights_results.__len__() == 0:
+            # Release the client's buffer now that it is folded in.
+            del weights
+            fit_res.parameters.tensors = []
+        if average.num_clients == 0:
             raise RuntimeError(
                 "aggregate_fit: No valid weights so cannot continue training."
             )
-        aggregated = aggregate(weights_results)
+        aggregated = average.result()
         self.signal_save_params(aggregated)
         return self.ndarrays_to_parameters(aggregated), {}
 
-    # Always change together with `views.store_params`.
+    def configure_evaluate(
+        self, server_round: int, parameters: Parameters, client_manager: ClientManager
+    ) -> list[tuple[ClientProxy, EvaluateIns]]:
+        if self.evaluate_every == 0 or server_round % self.evaluate_every != 0:
+            return []
+        return super().configure_evaluate(server_round, parameters, client_manager)
+
+    # Always change together with `scheduler.Server.receive`.
     def signal_save_params(self, params: list[NDArray]):
-        # TODO: Port resolution.
-        url = "http://localhost:8000/train/params"
-        data = {}
-        if self.coreml:
-            data["coreml"] = True
-        files = {"file": pickle.dumps(params)}
-        return requests.post(url, data=data, files=files)
-
-
-def fit_config(_: int):
-    """Return training configuration dict for each round.
-
-    Keep batch size fixed at 32, perform two rounds of training with one
-    local epoch, increase to two local epochs afterwards.
-    """
-    config: dict[str, Scalar] = {
-        "batch_size": 32,
-        "local_epochs": 2,
-    }
+        """Hand `params` to the scheduler in shared memory and
+        wait until they are stored."""
+        if self.channel is None:
+            logger.error("signal_save_params: No channel to the scheduler.")
+            return
+        data = encode_params(params)
+        size = len(data)
+        shm = publish(data)
+        del data
+        try:
+            self.channel.send(("params", shm.name, size))
+            err = self.channel.recv()
+            if err is not None:
+                logger.error(f"signal_save_params: {err}")
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+ParamsSource = tuple[str, str, int]
+"""Where stored parameters are: `("file", path, size)` or
+`("shm", shared_memory_name, size)`."""
+
+
+def load_params(
+    source: ParamsSource | None, layers: list[int] | None
+) -> Parameters | None:
+    """Parameters from `source` in the `codec` stored format, mapped instead
+    of copied until converted to the tensors Flower sends."""
+    if source is None:
+        return None
+    kind, name, size = source
+    try:
+        if kind == "shm":
+            with attached(name, size) as data:
+                return ndarrays_to_parameters(decode_params(data), layers)
+        with open(name, "rb") as file, mmap(
+            file.fileno(), 0, access=ACCESS_READ
+        ) as data:
+            return ndarrays_to_parameters(decode_params(data), layers)
+    except (OSError, ValueError) as err:
+        logger.error(f"load_params: starting fresh because of {err}")
+
+
+def fit_config(batch_size: int, local_epochs: int):
+    """Training configuration dict for each round."""
+
+    def config(_: int) -> dict[str, Scalar]:
+        return {"batch_size": batch_size, "local_epochs": local_epochs}
+
     return config
 
 
-def flwr_server(initial_parameters: Parameters | None, port: int, coreml=False):
-    # TODO: Make configurable.
+def flwr_server(
+    initial_params: ParamsSource | None,
+    port: int,
+    session_id: int,
+    layers: list[int] | None = None,
+    config: dict | None = None,
+    channel: Connection | None = None,
+):
+    """Run a Flower server configured by `config`, a complete
+    `serializers.TrainingConfigSerializer` data, or the default if `None`."""
+    if config is None:
+        config = TRAINING_CONFIG
+    initial_parameters = load_params(initial_params, layers)
+    if channel is not None:
+        # Let the scheduler release `initial_params`.
+        channel.send(("loaded", None, None))
     strategy = FedAvgAndroidSave(
-        fraction_fit=1.0,
-        fraction_evaluate=1.0,
-        min_fit_clients=1,
-        min_evaluate_clients=1,
-        min_available_clients=1,
+        fraction_fit=config["fraction_fit"],
+        fraction_evaluate=config["fraction_evaluate"],
+        min_fit_clients=config["min_fit_clients"],
+        min_evaluate_clients=config["min_evaluate_clients"],
+        min_available_clients=config["min_available_clients"],
         evaluate_fn=None,
-        on_fit_config_fn=fit_config,
+        on_fit_config_fn=fit_config(config["batch_size"], config["local_epochs"]),
         initial_parameters=initial_parameters,
     )
-    strategy.coreml = coreml
+    strategy.channel = channel
+    strategy.layers = layers
+    strategy.quorum = config["quorum"]
+    strategy.evaluate_every = config["evaluate_every"]
+
+    server = None
+    if config["buffer_size"] is not None:
+        server = BufferedServer(
+            client_manager=SimpleClientManager(),
+            strategy=strategy,
+            buffer_size=config["buffer_size"],
+        )
 
-    logger.warning(f"Starting Flower server with coreml {coreml}.")
+    logger.warning(f"Starting Flower server for session {session_id} on {port}.")
     try:
-        # Start Flower server for 3 rounds of federated learning
         start_server(
             server_address=f"0.0.0.0:{port}",
-            config=ServerConfig(num_rounds=3),
+            server=server,
+            config=ServerConfig(
+                num_rounds=config["num_rounds"], round_timeout=config["round_timeout"]
+            ),
             strategy=strategy,
         )
     except KeyboardInterrupt:
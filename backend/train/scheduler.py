@@ -1,85 +1,386 @@
+from concurrent.futures import Future
+from datetime import timedelta
 from logging import getLogger
-from multiprocessing import Process
-from threading import Thread
+from math import ceil
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock, Thread
+from time import monotonic
 
-from flwr.common import Parameters
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
 from telemetry.models import TrainingSession
+from train.aio import submit_blocking
+from train.blobs import blob_store
+from train.checkpoints import save_params
+from train.codec import encode_params
 from train.data import ServerData
-from train.models import MLModel, ModelParams
-from train.run import flwr_server
+from train.delta import FULL
+from train.models import FlowerServer, MLModel, ModelParams
+from train.run import ParamsSource
+from train.shm import attached, publish
+from train.workers import pool
 
-TF_PORT = 8080
-CM_PORT = 8088
+from backend.settings import (
+    FLOWER_HEARTBEAT_INTERVAL,
+    FLOWER_HEARTBEAT_TIMEOUT,
+    FLOWER_IDLE_TIMEOUT,
+    FLOWER_KILL_GRACE,
+    FLOWER_PORTS,
+    FLOWER_SESSION_TIMEOUT,
+    MAX_FLOWER_SERVERS,
+)
+
+QUEUE_TIMEOUT = 2 * 60
 
 logger = getLogger(__name__)
 
 
-def model_params(model: MLModel):
+def model_layers(model: MLModel) -> list[int] | None:
+    """Layer manifest to validate parameters against, if known."""
+    return None if model.coreml else model.tflite_layers
+
+
+def model_params(model: MLModel) -> tuple[ParamsSource | None, SharedMemory | None]:
+    """Where `model`'s latest parameters are for a Flower server to map,
+    and the shared memory segment to release after it has,
+    if they were not stored in full as a blob."""
+    params: ModelParams | None = model.params.last()  # type: ignore
+    if params is None:
+        return None, None
+    if params.encoding == FULL and params.digest is not None:
+        path = str(blob_store.path(params.digest))
+        return ("file", path, params.size), None  # type: ignore
     try:
-        params: ModelParams = model.params.last()  # type: ignore
-        if params is None:
-            return
-        tensors = [param.tobytes() for param in params.decode_params()]
-        return Parameters(tensors, tensor_type="numpy.ndarray")
-    except RuntimeError as err:
+        data = encode_params(params.cached_params())
+    except (RuntimeError, ValueError) as err:
         logger.warning(err)
+        return None, None
+    shm = publish(data)
+    return ("shm", shm.name, len(data)), shm
 
 
-TEN_MINUTES = 10 * 60
+def timeouts(config: dict) -> tuple[float, float]:
+    """Seconds a Flower server with training `config` may run in total and
+    without handing anything over. With a `round_timeout`, enough for every
+    round to fit and evaluate in time, after up to `FLOWER_IDLE_TIMEOUT`
+    waiting for clients, as rounds only start once enough are connected.
+    A buffered version may take `buffer_size` updates from as few as
+    `min_available_clients` clients, each fitting once per `round_timeout`."""
+    round_timeout = config["round_timeout"]
+    if round_timeout is None:
+        return FLOWER_SESSION_TIMEOUT, FLOWER_IDLE_TIMEOUT
+    num_rounds, evaluate_every = config["num_rounds"], config["evaluate_every"]
+    buffer_size = config["buffer_size"]
+    evaluated, fits = 0, 1
+    if buffer_size is not None:
+        fits = ceil(buffer_size / config["min_available_clients"])
+    elif evaluate_every > 0:
+        evaluated = num_rounds // evaluate_every
+    per_round = fits + (1 if evaluated else 0)
+    return (
+        (fits * num_rounds + evaluated) * round_timeout + FLOWER_IDLE_TIMEOUT,
+        per_round * round_timeout + FLOWER_IDLE_TIMEOUT,
+    )
 
 
 class Server:
-    """Spawn a new background Flower server process and monitor it."""
+    """Spawn a new background Flower server process for `supervisor` to
+    monitor."""
 
-    def __init__(self, model: MLModel, port: int, start_fresh: bool) -> None:
+    def __init__(
+        self,
+        model: MLModel,
+        port: int,
+        start_fresh: bool,
+        session: TrainingSession,
+    ) -> None:
         self.model = model
+        self.port = port
         self.start_fresh = start_fresh
-        params = None if start_fresh else model_params(model)
-        self.session = TrainingSession(tflite_model=model)
-        self.process = Process(target=flwr_server, args=(params, port, model.coreml))
-        self.process.start()
-        self.timeout = Thread(target=Process.join, args=(self.process, TEN_MINUTES))
-        self.timeout.start()
-        self.update_session_end_time()
-        logger.warning(f"Started flower server for model {model}")
+        self.session = session
+        params, self.shm = (None, None) if start_fresh else model_params(model)
+        worker = pool.take()
+        self.worker = worker
+        self.process = worker.process
+        self.conn = worker.conn
+        config = model.training_config()
+        worker.serve(params, port, self.session.id, model_layers(model), config)
+        self.started = monotonic()
+        self.active = self.started
+        """When the server last handed anything over."""
+        self.session_timeout, self.idle_timeout = timeouts(config)
+        self.stopping: float | None = None
+        """When the server was last asked to stop, if it was."""
+        supervisor.watch(self)
+        logger.warning(f"Started flower server for model {model} on port {port}")
 
     def update_session_end_time(self):
         self.session.save()
 
+    def release_initial_params(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    # Always change together with `run.FedAvgAndroidSave.signal_save_params`.
+    def receive(self):
+        """Handle one message from the Flower server through `conn`:
+        release the initial parameters once loaded, or store a checkpoint.
+        Raise `EOFError` or `OSError` if the server is gone."""
+        kind, name, size = self.conn.recv()
+        self.active = monotonic()
+        if kind == "loaded":
+            self.release_initial_params()
+            return
+        err = None
+        try:
+            with attached(name, size) as data:
+                save_params(self.model, data, self.session)
+            self.update_session_end_time()
+        except Exception as e:
+            logger.error(f"Failed to store params of {self.model}: {e}")
+            err = str(e)
+        finally:
+            close_old_connections()
+        self.conn.send(err)
+
+    def deadline(self) -> float:
+        """`monotonic` time to stop the server at, or to kill it at if it
+        was asked to stop but has not."""
+        if self.stopping is not None:
+            return self.stopping + FLOWER_KILL_GRACE
+        return min(self.started + self.session_timeout, self.active + self.idle_timeout)
+
+    def enforce_deadline(self, now: float):
+        if now < self.deadline():
+            return
+        if self.stopping is None:
+            logger.warning(f"Stopping Flower server on {self.port} past its deadline.")
+            self.process.terminate()
+        else:
+            logger.error(f"Killing Flower server on {self.port} ignoring SIGTERM.")
+            self.process.kill()
+        self.stopping = now
+
+    def finish(self):
+        """Reap the exited process, stamp the session's end and free the port."""
+        self.process.join()
+        self.worker.close()
+        self.release_initial_params()
+        try:
+            self.update_session_end_time()
+            FlowerServer.objects.filter(
+                tflite_model_id=self.model.id, port=self.port
+            ).delete()
+        finally:
+            close_old_connections()
+        logger.warning(f"Flower server for {self.model} on {self.port} exited.")
+
+
+class Supervisor:
+    """Watch every Flower server this web worker runs from one thread:
+    store their checkpoints, stop them past their deadlines,
+    reap them as soon as they exit, and `heartbeat` them."""
+
+    def __init__(self) -> None:
+        self.servers: list[Server] = []
+        self.lock = Lock()
+        self.thread: Thread | None = None
+        self.wakeup, self.waker = Pipe(duplex=False)
+        """Written to make the supervisor wait on newly watched servers."""
+
+    def watch(self, server: Server):
+        with self.lock:
+            self.servers.append(server)
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.waker.send(None)
+
+    def watching(self) -> list[Server]:
+        with self.lock:
+            return list(self.servers)
+
+    def run(self):
+        next_heartbeat = monotonic() + FLOWER_HEARTBEAT_INTERVAL
+        while True:
+            try:
+                servers = self.watching()
+                deadline = min([next_heartbeat, *(s.deadline() for s in servers)])
+                self.step(servers, deadline - monotonic())
+                now = monotonic()
+                for server in servers:
+                    if server.process.exitcode is None:
+                        server.enforce_deadline(now)
+                if now >= next_heartbeat:
+                    next_heartbeat = now + FLOWER_HEARTBEAT_INTERVAL
+                    heartbeat(self.watching())
+            except Exception as err:
+                logger.error(f"Supervisor: {err}")
+
+    def step(self, servers: list[Server], timeout: float):
+        """Wait up to `timeout` seconds and handle whatever is ready."""
+        handles: dict[object, Server | None] = {self.wakeup: None}
+        for server in servers:
+            handles[server.process.sentinel] = server
+            if not server.conn.closed:
+                handles[server.conn] = server
+        exited: list[Server] = []
+        for handle in wait(list(handles), max(timeout, 0)):
+            server = handles[handle]
+            if server is None:
+                self.wakeup.recv()
+            elif handle is server.conn:
+                self.receive(server)
+            else:
+                exited.append(server)
+        for server in exited:
+            # Store any checkpoint handed over right before exiting.
+            while not server.conn.closed and server.conn.poll():
+                self.receive(server)
+            with self.lock:
+                self.servers.remove(server)
+            server.finish()
 
-tf_server: Server | None = None
-cm_server: Server | None = None
-"""CoreML servers"""
+    def receive(self, server: Server):
+        try:
+            server.receive()
+        except (EOFError, OSError):
+            server.conn.close()
+
+
+supervisor = Supervisor()
+
+
+def max_servers() -> int:
+    cap = len(FLOWER_PORTS)
+    return cap if MAX_FLOWER_SERVERS is None else min(cap, MAX_FLOWER_SERVERS)
 
 
 def cleanup_task():
-    global tf_server, cm_server
-    if tf_server is not None and not tf_server.process.is_alive():
-        tf_server = None
-    if cm_server is not None and not cm_server.process.is_alive():
-        cm_server = None
+    """Forget servers other workers stopped confirming,
+    and models that stopped asking for a server."""
+    pool.fill()
+    now = timezone.now()
+    FlowerServer.objects.filter(
+        port__isnull=False,
+        heartbeat__lt=now - timedelta(seconds=FLOWER_HEARTBEAT_TIMEOUT),
+    ).delete()
+    FlowerServer.objects.filter(
+        port__isnull=True, heartbeat__lt=now - timedelta(seconds=QUEUE_TIMEOUT)
+    ).delete()
+
+
+def heartbeat(servers: list[Server]):
+    """Confirm `servers`, which this worker runs, are alive."""
+    try:
+        cleanup_task()
+        now = timezone.now()
+        for server in servers:
+            FlowerServer.objects.filter(
+                tflite_model_id=server.model.id, port=server.port
+            ).update(heartbeat=now)
+    finally:
+        close_old_connections()
+
+
+def claim_port(record: FlowerServer, start_fresh: bool) -> TrainingSession | None:
+    """Claim a free port for queued `record` and attach a new session to it.
+    Return the session, or `None` if no port is free or another worker
+    started the server first."""
+    used = set(
+        FlowerServer.objects.filter(port__isnull=False).values_list("port", flat=True)
+    )
+    session = TrainingSession(tflite_model=record.tflite_model)
+    session.save()
+    for port in FLOWER_PORTS:
+        if port in used:
+            continue
+        try:
+            with transaction.atomic():
+                claimed = FlowerServer.objects.filter(
+                    pk=record.pk, port__isnull=True
+                ).update(
+                    port=port,
+                    start_fresh=start_fresh,
+                    session=session,
+                    heartbeat=timezone.now(),
+                )
+        except IntegrityError:
+            # Another worker took the port just now.
+            continue
+        if claimed:
+            record.port = port
+            return session
+        break
+    session.delete()
+    return None
 
 
 def server(model: MLModel, start_fresh: bool) -> ServerData:
-    """Request a Flower server. Return `(status, port)`.
+    """Request a Flower server. Return `(status, session_id, port)`.
     `status` is "started" if the server is already running,
+    "started_non_fresh" if running but not started fresh as requested,
     "new" if newly started,
-    or "occupied" if the background process is unavailable."""
-    global tf_server, cm_server
-    server, port = (cm_server, CM_PORT) if model.coreml else (tf_server, TF_PORT)
+    or "queued" if all servers are busy, with the model's `queue_position`
+    counting from 1. Queued models keep their position as long as they ask
+    again within `QUEUE_TIMEOUT` seconds.
+    Any web worker can answer, whichever worker runs the server."""
     cleanup_task()
-    if server:
-        if server.model == model:
-            if start_fresh and not server.start_fresh:
-                return ServerData("started_non_fresh", None, None)
-            return ServerData("started", server.session.id, port)
-        else:
-            return ServerData("occupied", None, None)
-    else:
-        # Start new server.
-        server = Server(model, port, start_fresh)
-        if model.coreml:
-            cm_server = server
-        else:
-            tf_server = server
-        return ServerData("new", server.session.id, port)
+    record, _ = FlowerServer.objects.get_or_create(
+        tflite_model=model,
+        defaults={"start_fresh": start_fresh, "heartbeat": timezone.now()},
+    )
+    if record.port is not None:
+        if start_fresh and not record.start_fresh:
+            return ServerData("started_non_fresh", None, None)
+        return ServerData("started", record.session_id, record.port)  # type: ignore
+    FlowerServer.objects.filter(pk=record.pk).update(heartbeat=timezone.now())
+    position = FlowerServer.objects.filter(port__isnull=True, pk__lt=record.pk).count()
+    running = FlowerServer.objects.filter(port__isnull=False).count()
+    if position >= max_servers() - running:
+        return ServerData("queued", None, None, position + 1)
+    session = claim_port(record, start_fresh)
+    if session is None:
+        try:
+            record.refresh_from_db()
+        except FlowerServer.DoesNotExist:
+            pass
+        if record.port is None:
+            return ServerData("queued", None, None, position + 1)
+        return ServerData("started", record.session_id, record.port)  # type: ignore
+    try:
+        server = Server(model, record.port, start_fresh, session)  # type: ignore
+    except Exception:
+        record.delete()
+        raise
+    FlowerServer.objects.filter(pk=record.pk).update(pid=server.process.pid)
+    return ServerData("new", session.id, server.port)
+
+
+_in_flight: dict[tuple[int, bool], Future[ServerData]] = {}
+"""`server` calls running, by model ID and `start_fresh`."""
+_in_flight_lock = Lock()
+
+
+def coalesced_server(model: MLModel, start_fresh: bool) -> Future[ServerData]:
+    """Future result of `server` in `aio.executor`, shared by all concurrent
+    requests for the same model so only the first one starts the server.
+    The lock is only held to look up or register the future."""
+    key = (model.id, start_fresh)
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        future = _in_flight[key] = submit_blocking(server, model, start_fresh)
+
+    def forget(_):
+        with _in_flight_lock:
+            if _in_flight.get(key) is future:
+                del _in_flight[key]
+
+    future.add_done_callback(forget)
+    return future
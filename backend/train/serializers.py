@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from train.models import MLModel
 
+from backend.settings import TRAINING_CONFIG
+
 
 # Always change together with `models.MLModel`.
 class MLModelSerializer(serializers.Serializer):
@@ -12,6 +14,10 @@ class MLModelSerializer(serializers.Serializer):
     coreml_layers = serializers.JSONField(allow_null=True)
     tflite = serializers.BooleanField()
     coreml = serializers.BooleanField()
+    training = serializers.SerializerMethodField()
+
+    def get_training(self, model: MLModel) -> dict:
+        return model.training_config()
 
     class Meta:
         model = MLModel
@@ -24,6 +30,7 @@ class MLModelSerializer(serializers.Serializer):
             "coreml_layers",
             "tflite",
             "coreml",
+            "training",
         ]
 
 
@@ -41,6 +48,48 @@ class PostServerDataSerializer(serializers.Serializer):
     start_fresh = serializers.BooleanField(required=False, default=False)
 
 
+# Always change together with `settings.TRAINING_CONFIG`
+# & `run.flwr_server`.
+class TrainingConfigSerializer(serializers.Serializer):
+    """Keys left out are not stored, so the model keeps following
+    `settings.TRAINING_CONFIG` for them."""
+
+    num_rounds = serializers.IntegerField(min_value=1, required=False)
+    fraction_fit = serializers.FloatField(min_value=0.0, max_value=1.0, required=False)
+    fraction_evaluate = serializers.FloatField(
+        min_value=0.0, max_value=1.0, required=False
+    )
+    min_fit_clients = serializers.IntegerField(min_value=1, required=False)
+    min_evaluate_clients = serializers.IntegerField(min_value=0, required=False)
+    min_available_clients = serializers.IntegerField(min_value=1, required=False)
+    evaluate_every = serializers.IntegerField(min_value=0, required=False)
+    """Evaluate every this many rounds, or never if 0."""
+    batch_size = serializers.IntegerField(min_value=1, required=False)
+    local_epochs = serializers.IntegerField(min_value=1, required=False)
+    round_timeout = serializers.FloatField(allow_null=True, required=False)
+    """Seconds to wait for clients each round, or `None` to wait for all."""
+    quorum = serializers.IntegerField(min_value=1, required=False)
+    """Fewest results to aggregate a round from, or else it is skipped.
+    At most `min_fit_clients`, which is all a round may sample."""
+    buffer_size = serializers.IntegerField(min_value=1, allow_null=True, required=False)
+    """Aggregate asynchronously every this many client updates, each round
+    being one aggregation, instead of in synchronous rounds if `None`.
+    See `buffered.BufferedServer`."""
+
+    def validate_round_timeout(self, value: float | None) -> float | None:
+        if value is not None and value <= 0:
+            raise serializers.ValidationError("Ensure this value is positive.")
+        return value
+
+    def validate(self, attrs: dict) -> dict:
+        config = {**TRAINING_CONFIG, **attrs}
+        if config["quorum"] > config["min_fit_clients"]:
+            raise serializers.ValidationError(
+                {"quorum": "Ensure this value is at most `min_fit_clients`."}
+            )
+        return attrs
+
+
 # Always change together with `upload` in `fed_kit.py`.
 class UploadModelSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=256)
@@ -51,3 +100,4 @@ class UploadModelSerializer(serializers.Serializer):
         allow_null=True, child=serializers.DictField()
     )
     data_type = serializers.CharField(max_length=256)
+    training = TrainingConfigSerializer(required=False, allow_null=True, default=None)
@@ -0,0 +1,38 @@
+"""Handing buffers between processes through shared memory."""
+import sys
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+
+
+def publish(data) -> SharedMemory:
+    """New shared memory segment holding a copy of `data`.
+    The caller owns it and must `close` and `unlink` it."""
+    view = memoryview(data).cast("B")
+    shm = SharedMemory(create=True, size=max(view.nbytes, 1))
+    shm.buf[: view.nbytes] = view
+    return shm
+
+
+@contextmanager
+def attached(name: str, size: int):
+    """View of the first `size` bytes of segment `name`, owned by another
+    process. The view must not be used after the context exits."""
+    if sys.version_info >= (3, 13):
+        shm = SharedMemory(name=name, track=False)
+    else:
+        # Before 3.13, attaching registers the segment with the resource
+        # tracker again. The owner and Flower workers, forked from its
+        # forkserver, share one tracker, where registering is idempotent
+        # and the owner's `unlink` unregisters the segment.
+        shm = SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        yield view
+    finally:
+        try:
+            view.release()
+            shm.close()
+        except BufferError:
+            # Arrays over `view` are still alive; the mapping is released
+            # when they are garbage collected.
+            pass
@@ -1,8 +1,8 @@
 from django.urls import path
 from train.views import (
     advertise_model,
+    download_model,
     request_server,
-    store_params,
     upload_model,
 )
 
@@ -10,5 +10,5 @@ urlpatterns = [
     path("advertised", advertise_model),
     path("server", request_server),
     path("upload", upload_model),
-    path("params", store_params),
+    path("download/<int:id>/<str:kind>", download_model),
 ]
@@ -1,25 +1,54 @@
 import logging
+from asyncio import wrap_future
 from json import load
-from typing import IO, OrderedDict
+from pathlib import Path
+from stat import S_ISREG
+from typing import OrderedDict
 
+from django.core.exceptions import SuspiciousFileOperation
 from django.core.files.uploadedfile import UploadedFile
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils._os import safe_join
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
 from rest_framework import permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.request import MultiValueDict  # type: ignore
 from rest_framework.response import Response
-from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
+from rest_framework.status import (
+    HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND,
+)
 from rest_framework.views import Request  # type: ignore
-from train import scheduler
-from train.models import MLModel, ModelParams, TrainingDataType
-from train.scheduler import cleanup_task, server
+from train.advertised import advertised, invalidate_advertised
+from train.aio import is_asgi, json_body, respond, run_blocking, streamed
+from train.files import (
+    model_file_path,
+    negotiate,
+    parse_range,
+    precompress,
+    read_range,
+    remove_with_variants,
+    save_streaming,
+)
+from train.models import MLModel, TrainingDataType
+from train.scheduler import coalesced_server
 from train.serializers import (
-    MLModelSerializer,
     PostAdvertisedDataSerializer,
     PostServerDataSerializer,
     UploadModelSerializer,
 )
+from train.workers import pool
 
-from backend.settings import BASE_DIR
+from backend.settings import BASE_DIR, MAX_MODEL_FILE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -37,49 +66,44 @@ def deserialize(cls, data):
         return (validated, serializer.errors)
 
 
-def ml_model_for_data_type(data: OrderedDict):
-    try:
-        data_type = TrainingDataType.objects.get(name=data["data_type"])
-        filter = MLModel.objects.filter(data_type=data_type)
-        if data["tflite"]:
-            filter = filter.filter(tflite=True)
-        if data["coreml"]:
-            filter = filter.filter(coreml=True)
-        return filter.last()
-    except Exception as err:
-        logger.error(f"{err} while looking up model for `{data}`.")
-        return
+def etag_matches(request: HttpRequest, etag: str) -> bool:
+    """Whether `If-None-Match` in `request` lists `etag`."""
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
 
 
-# https://www.django-rest-framework.org/api-guide/views/#api_view
-@api_view(["POST"])
-# https://stackoverflow.com/questions/31335736/cannot-apply-djangomodelpermissions-on-a-view-that-does-not-have-queryset-pro
-@permission_classes((permissions.AllowAny,))
-def advertise_model(request: Request):
-    (data, err) = deserialize(PostAdvertisedDataSerializer, request.data)
+@csrf_exempt
+@require_POST
+async def advertise_model(request: HttpRequest):
+    (data, err) = deserialize(PostAdvertisedDataSerializer, json_body(request))
     if err:
-        return Response(err, HTTP_400_BAD_REQUEST)
-    model = ml_model_for_data_type(data)
-    if model is None:
-        return Response("No model corresponding to data_type", HTTP_404_NOT_FOUND)
-    cleanup_task()
-    serializer = MLModelSerializer(model)
-    return Response(serializer.data)
+        return respond(err, HTTP_400_BAD_REQUEST)
+    found = await run_blocking(advertised, data)
+    if found is None:
+        return respond("No model corresponding to data_type", HTTP_404_NOT_FOUND)
+    pool.fill()
+    body, etag = found
+    if etag_matches(request, etag):
+        return HttpResponseNotModified(headers={"ETag": etag})
+    return respond(body, headers={"ETag": etag})
 
 
-@api_view(["POST"])
-@permission_classes((permissions.AllowAny,))
-def request_server(request: Request):
-    (data, err) = deserialize(PostServerDataSerializer, request.data)
+@csrf_exempt
+@require_POST
+async def request_server(request: HttpRequest):
+    (data, err) = deserialize(PostServerDataSerializer, json_body(request))
     if err:
-        return Response(err, HTTP_400_BAD_REQUEST)
+        return respond(err, HTTP_400_BAD_REQUEST)
     try:
-        model = MLModel.objects.get(pk=data["id"])
+        model = await MLModel.objects.aget(pk=data["id"])
     except MLModel.DoesNotExist:
         logger.error(f"Model with id {data['id']} not found.")
-        return Response("Model not found", HTTP_404_NOT_FOUND)
-    response = server(model, data["start_fresh"])
-    return Response(response.__dict__)
+        return respond("Model not found", HTTP_404_NOT_FOUND)
+    response = await wrap_future(coalesced_server(model, data["start_fresh"]))
+    return respond(response.__dict__)
 
 
 def file_in_request(request: Request, name: str):
@@ -87,7 +111,7 @@ def file_in_request(request: Request, name: str):
     if isinstance(files, MultiValueDict):
         file = files.get(name)
         if isinstance(file, UploadedFile) and file.name and file.file:
-            return (file.name, file.file)
+            return file
 
 
 def model_name_not_unique(file_name: str):
@@ -108,12 +132,21 @@ def get_data_type(data_type_name: str):
     return data_type
 
 
-def save_model_file(name: str, file_name: str, file: IO):
-    """Given that the name is unique, guarantee unique file name."""
-    path = f"static/{name}--{file_name}"
-    with open(BASE_DIR / path, "wb") as fd:
-        fd.write(file.read())
-    return path
+def save_model_file(name: str, file: UploadedFile):
+    """Given that the name is unique, guarantee unique file name.
+    Return `(path, digest, size)`.
+    Raise `ValueError` if the file exceeds `MAX_MODEL_FILE_SIZE`,
+    checking its declared size before copying anything."""
+    if file.size is not None and file.size > MAX_MODEL_FILE_SIZE:
+        raise ValueError(f"File larger than {MAX_MODEL_FILE_SIZE} bytes.")
+    path = f"static/{name}--{file.name}"
+    digest, size = save_streaming(BASE_DIR / path, file.file, MAX_MODEL_FILE_SIZE)
+    try:
+        precompress(BASE_DIR / path)
+    except BaseException:
+        remove_with_variants(BASE_DIR / path)
+        raise
+    return path, digest, size
 
 
 @api_view(["POST"])
@@ -128,47 +161,128 @@ def upload_model(request: Request):
         return Response("Model name used", HTTP_400_BAD_REQUEST)
     tflite = data["tflite_layers"] is not None
     coreml = data["coreml_layers"] is not None
-    tflite_path, coreml_path = None, None
-    if tflite:
-        file = file_in_request(request, "tflite")
-        if file is None:
-            return Response("No TFLite file in request.", HTTP_400_BAD_REQUEST)
-        tflite_path = save_model_file(name, *file)
-    if coreml:
-        file = file_in_request(request, "coreml")
-        if file is None:
-            return Response("No CoreML file in request.", HTTP_400_BAD_REQUEST)
-        coreml_path = save_model_file(name, *file)
+    tflite_file = file_in_request(request, "tflite") if tflite else None
+    if tflite and tflite_file is None:
+        return Response("No TFLite file in request.", HTTP_400_BAD_REQUEST)
+    coreml_file = file_in_request(request, "coreml") if coreml else None
+    if coreml and coreml_file is None:
+        return Response("No CoreML file in request.", HTTP_400_BAD_REQUEST)
+    tflite_path, tflite_digest, tflite_size = None, None, None
+    coreml_path, coreml_digest, coreml_size = None, None, None
+    try:
+        if tflite_file is not None:
+            tflite_path, tflite_digest, tflite_size = save_model_file(name, tflite_file)
+        if coreml_file is not None:
+            coreml_path, coreml_digest, coreml_size = save_model_file(name, coreml_file)
+    except Exception as err:
+        # Leave no TFLite file behind for a model that is not saved.
+        if tflite_path is not None:
+            remove_with_variants(BASE_DIR / tflite_path)
+        if not isinstance(err, ValueError):
+            raise
+        logger.error(f"upload: {err}")
+        return Response(str(err), HTTP_400_BAD_REQUEST)
     data_type = get_data_type(data_type_name)
     model = MLModel(
         name=name,
         tflite_path=tflite_path,
         coreml_path=coreml_path,
+        tflite_digest=tflite_digest,
+        coreml_digest=coreml_digest,
+        tflite_size=tflite_size,
+        coreml_size=coreml_size,
         tflite_layers=data["tflite_layers"],
         coreml_layers=data["coreml_layers"],
+        training=data["training"],
         data_type=data_type,
         tflite=tflite,
         coreml=coreml,
     )
     model.save()
+    invalidate_advertised()
 
     return Response("ok")
 
 
-# Always change together with `run.FedAvgAndroidSave`.
-@api_view(["POST"])
-@permission_classes((permissions.AllowAny,))
-def store_params(request: Request):
-    coreml = request.data.get("coreml", False)
-    server = scheduler.cm_server if coreml else scheduler.tf_server
-    if server is None:
-        logger.error("No server running but got params to store.")
-        return Response("No server running.", HTTP_400_BAD_REQUEST)
-    file = file_in_request(request, "file")
-    if file is None:
-        return Response("No file in request.", HTTP_400_BAD_REQUEST)
-    params = file[1].read()
-    to_save = ModelParams(params=params, tflite_model=server.model)
-    to_save.save()
-    server.update_session_end_time()
-    return Response("ok")
+def serve_file(
+    request: HttpRequest, path: Path, digest: str | None, immutable: bool
+) -> HttpResponse:
+    """Serve `path`, precompressed if `Accept-Encoding` allows,
+    resumable with `Range`, only its headers to `HEAD`.
+    `digest` versions the file if known."""
+    path, encoding = negotiate(path, request.headers.get("Accept-Encoding", ""))
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise Http404("File missing.")
+    if not S_ISREG(stat.st_mode):
+        raise Http404("Not a file.")
+    version = digest or f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    etag = f'"{version}{encoding or ""}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Vary": "Accept-Encoding"}
+    if immutable:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if etag_matches(request, etag):
+        return HttpResponseNotModified(headers=headers)
+    status, start, end = 200, 0, stat.st_size - 1
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return HttpResponse(status=416, headers=headers)
+        if byte_range is not None:
+            status, (start, end) = 206, byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    if request.method == "HEAD":
+        return HttpResponse(
+            status=status, content_type="application/octet-stream", headers=headers
+        )
+    if status == 200 and not is_asgi(request):
+        # `FileResponse` lets a WSGI server use `sendfile` for the whole file.
+        return FileResponse(
+            open(path, "rb"), content_type="application/octet-stream", headers=headers
+        )
+    return StreamingHttpResponse(
+        streamed(request, read_range(path, start, end)),
+        status=status,
+        content_type="application/octet-stream",
+        headers=headers,
+    )
+
+
+def model_file(request: HttpRequest, id: int, kind: str) -> HttpResponse:
+    if kind not in ("tflite", "coreml"):
+        raise Http404("Unknown model file kind.")
+    model = get_object_or_404(MLModel, pk=id)
+    if kind == "tflite":
+        stored_path, digest = model.tflite_path, model.tflite_digest
+    else:
+        stored_path, digest = model.coreml_path, model.coreml_digest
+    if stored_path is None:
+        raise Http404(f"Model has no {kind} file.")
+    # Model files never change once uploaded.
+    return serve_file(request, model_file_path(stored_path), digest, True)
+
+
+@require_safe
+async def download_model(request: HttpRequest, id: int, kind: str):
+    """Download the `kind` (`"tflite"` or `"coreml"`) file of model `id`,
+    precompressed if `Accept-Encoding` allows, resumable with `Range`."""
+    return await run_blocking(model_file, request, id, kind)
+
+
+@require_safe
+async def static_file(request: HttpRequest, path: str):
+    """Serve `static/`, where model files are, when no web server is in front.
+    `runserver` serves it itself instead."""
+    try:
+        file = Path(safe_join(BASE_DIR / "static", path))
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    return await run_blocking(serve_file, request, file, None, False)
@@ -0,0 +1,134 @@
+"""Pre-started processes to run Flower servers in."""
+import os
+from atexit import register
+from logging import getLogger
+from multiprocessing import Pipe, get_context
+from multiprocessing.connection import Connection
+from threading import Lock, Thread
+
+from train.run import flwr_server
+
+from backend.settings import FLOWER_WARM_WORKERS
+
+# Workers are forked from a clean server process rather than from the
+# multithreaded web worker, so they inherit neither its listening socket and
+# signal handlers nor the pipes of other workers.
+context = get_context("forkserver")
+context.set_forkserver_preload(["train.run"])
+
+logger = getLogger(__name__)
+
+
+def exit_with_parent(lifeline: Connection):
+    """Exit once the web worker that started this process is gone,
+    which closes the other end of `lifeline`, however it exited."""
+    try:
+        lifeline.recv()
+    except (EOFError, OSError):
+        pass
+    logger.warning("Web worker gone, exiting.")
+    os._exit(1)
+
+
+def wait_and_serve(conn: Connection, lifeline: Connection):
+    """Wait for `flwr_server` arguments, or `None` to exit.
+    `conn` is then the server's channel to the scheduler."""
+    Thread(target=exit_with_parent, args=(lifeline,), daemon=True).start()
+    try:
+        args = conn.recv()
+        if args is not None:
+            flwr_server(*args, channel=conn)
+    except EOFError:
+        return
+    finally:
+        conn.close()
+
+
+class Worker:
+    """Process that has imported Flower and waits to run a server."""
+
+    def __init__(self) -> None:
+        self.conn, child_conn = Pipe()
+        lifeline, self.lifeline = Pipe(duplex=False)
+        """Never written, only closed when this web worker exits."""
+        self.process = context.Process(
+            target=wait_and_serve, args=(child_conn, lifeline)
+        )
+        self.process.start()
+        child_conn.close()
+        lifeline.close()
+
+    def serve(self, *args):
+        """Run `flwr_server(*args)` in the worker.
+        `conn` then carries its checkpoints."""
+        self.conn.send(args)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.close()
+
+    def close(self):
+        self.conn.close()
+        self.lifeline.close()
+
+
+class WorkerPool:
+    """Keep `size` idle workers, refilled in the background as taken."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.idle: list[Worker] = []
+        self.lock = Lock()
+        self.refilling = False
+        self.closed = False
+
+    def take(self) -> Worker:
+        """An idle worker, or a new one if none is ready."""
+        with self.lock:
+            while self.idle:
+                worker = self.idle.pop()
+                if worker.process.is_alive():
+                    break
+                worker.close()
+            else:
+                worker = None
+        self.fill()
+        return Worker() if worker is None else worker
+
+    def fill(self):
+        """Start workers up to `size` in a background thread."""
+        with self.lock:
+            if self.refilling or self.closed or len(self.idle) >= self.size:
+                return
+            self.refilling = True
+        Thread(target=self._refill, daemon=True).start()
+
+    def _refill(self):
+        try:
+            while True:
+                with self.lock:
+                    if self.closed or len(self.idle) >= self.size:
+                        return
+                worker = Worker()
+                with self.lock:
+                    self.idle.append(worker)
+        except Exception as err:
+            logger.error(f"WorkerPool: failed to start worker: {err}")
+        finally:
+            with self.lock:
+                self.refilling = False
+
+    def close(self):
+        """Stop idle workers so they do not block interpreter exit."""
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            worker.stop()
+
+
+pool = WorkerPool(FLOWER_WARM_WORKERS)
+register(pool.close)
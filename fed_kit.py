@@ -25,14 +25,18 @@ def upload(
     coreml_layers: list[dict[str, str | bool]] | None,
     data_type: str,
     base: str = DEFAULT_URL,
+    training: dict | None = None,
 ):
-    """Upload model `file` and store it as `name` on the backend."""
+    """Upload model `file` and store it as `name` on the backend.
+    `training` overrides the default training configuration,
+    see `TrainingConfigSerializer` in `train.serializers`."""
     url = base + "/train/upload"
     data = {
         "name": name,
         "tflite_layers": tflite_layers,
         "coreml_layers": coreml_layers,
         "data_type": data_type,
+        "training": training,
     }
     files: dict = {"data": dumps(data, separators=(",", ":"))}
     if tflite_file is not None: